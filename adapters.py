@@ -1,133 +1,325 @@
 """
 Adapters to make FastAPI work with different server types.
 This module provides adapters to run FastAPI with WSGI servers like gunicorn.
+
+The WSGI bridge is kept for legacy deployments only. The FastAPI app should be
+served natively by an ASGI server, which avoids the per-request bridging
+entirely:
+
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:application
 """
 
+import asyncio
+import atexit
 import logging
+import queue
 import sys
-from io import BytesIO
+import threading
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Logging is configured by the application entry point
 logger = logging.getLogger(__name__)
 
+# Use uvloop for the bridge event loop when it is installed
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    logger.info("uvloop not installed, using the default asyncio event loop")
+
+# Size of each request body chunk passed to the ASGI app
+BODY_CHUNK_SIZE = 64 * 1024
+
+# Translation from WSGI environ key spelling to lowercase ASGI header names
+_HEADER_NAME_TRANS = bytes.maketrans(b'_ABCDEFGHIJKLMNOPQRSTUVWXYZ', b'-abcdefghijklmnopqrstuvwxyz')
+
+# Headers that WSGI passes without the HTTP_ prefix
+_SPECIAL_HEADERS = (
+    ('CONTENT_TYPE', b'content-type'),
+    ('CONTENT_LENGTH', b'content-length'),
+)
+
+# Decoded response header names (lowercase per the ASGI spec), plus values of
+# headers that repeat across responses (content-type, server, ...). Values
+# such as content-length and date are decoded each time to keep it bounded.
+_HEADER_CACHE = {}
+_CACHED_VALUE_HEADERS = frozenset((b'content-type', b'server', b'vary', b'cache-control'))
+_HEADER_CACHE_MAX = 1024
+
+
+def _decode_header(raw):
+    """Decode a header name or value, caching the result"""
+    text = _HEADER_CACHE.get(raw)
+    if text is None:
+        text = raw.decode('latin1')
+        if len(_HEADER_CACHE) < _HEADER_CACHE_MAX:
+            _HEADER_CACHE[raw] = text
+    return text
+
+
+def _decode_header_pair(pair):
+    """Decode an ASGI (name, value) header pair to the str pair WSGI expects"""
+    name, value = pair
+    if name in _CACHED_VALUE_HEADERS:
+        return _decode_header(name), _decode_header(value)
+    return _decode_header(name), value.decode('latin1')
+
+
+# Static fallback response used when the app fails before responding
+_ERROR_STATUS = '500 Internal Server Error'
+_ERROR_HEADERS = (('Content-Type', 'text/plain'),)
+_ERROR_BODY = b'Internal Server Error'
+
+# Fields shared by every ASGI scope. The 'asgi' sub-dict is read-only per the
+# spec, so it is shared; 'extensions' may be written by middleware and is
+# created per request.
+_SCOPE_TEMPLATE = {
+    'type': 'http',
+    'asgi': {
+        'version': '3.0',
+        'spec_version': '2.1',
+    },
+    'http_version': '1.1',
+}
+
+# Response statuses that must not include a body
+_BODYLESS_STATUSES = frozenset((204, 304))
+
+# Queue markers used to hand the response from the ASGI app to the WSGI server
+_RESPONSE_STARTED = object()
+_RESPONSE_FINISHED = object()
+
+# One event loop per worker process, run in a background thread and shared by
+# all WSGI threads so their ASGI work overlaps. It is started on first use so
+# that it is created after gunicorn forks the worker.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    """Return the shared background event loop, starting it if needed"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='asgi-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _stop_loop():
+    """Stop the background event loop on worker shutdown"""
+    if _loop is not None and _loop.is_running():
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+atexit.register(_stop_loop)
+
+class _RequestState:
+    """Per-request state shared by the ASGI receive and send callables"""
+    
+    __slots__ = ('wsgi_input', 'remaining', 'status', 'headers', 'queue', 'discard_body',
+                 'body_consumed', 'disconnected')
+    
+    def __init__(self, wsgi_input, content_length, discard_body=False):
+        self.wsgi_input = wsgi_input
+        self.remaining = content_length
+        self.discard_body = discard_body
+        self.status = None
+        self.headers = None
+        self.queue = queue.SimpleQueue()
+        self.body_consumed = False
+        self.disconnected = asyncio.Event()
+    
+    async def receive(self):
+        """ASGI receive: hand the request body over in bounded chunks"""
+        if self.body_consumed:
+            # Later calls come from disconnect listeners such as Starlette's
+            # streaming responses; block until the request is over instead of
+            # returning empty body messages in a busy loop
+            await self.disconnected.wait()
+            return {'type': 'http.disconnect'}
+        
+        remaining = self.remaining
+        # wsgi.input blocks, so read it off the shared event loop
+        chunk = await asyncio.to_thread(self.wsgi_input.read, min(remaining, BODY_CHUNK_SIZE)) if remaining > 0 else b''
+        remaining = self.remaining = remaining - len(chunk) if chunk else 0
+        self.body_consumed = remaining <= 0
+        return {
+            'type': 'http.request',
+            'body': chunk,
+            'more_body': remaining > 0,
+        }
+    
+    async def send(self, message):
+        """ASGI send: record the status line and queue body chunks"""
+        message_type = message['type']
+        
+        if message_type == 'http.response.start':
+            self.status = status = message['status']
+            self.headers = list(map(_decode_header_pair, message.get('headers', ())))
+            if status in _BODYLESS_STATUSES:
+                self.discard_body = True
+            self.queue.put_nowait(_RESPONSE_STARTED)
+        elif message_type == 'http.response.body':
+            # HEAD requests and 204/304 responses never carry a body
+            if not self.discard_body:
+                self.queue.put_nowait(message.get('body', b''))
+
+
+class _ResponseBody:
+    """
+    WSGI response iterable yielding body chunks as the app sends them
+
+    WSGI servers call close() when the response ends, even if they never
+    started iterating, so the app is stopped there rather than in a
+    generator's finally block, which only runs once iteration has begun.
+    """
+    
+    __slots__ = ('state', 'future', 'finished')
+    
+    def __init__(self, state, future):
+        self.state = state
+        self.future = future
+        self.finished = False
+    
+    def __iter__(self):
+        response_queue = self.state.queue
+        while True:
+            chunk = response_queue.get()
+            if chunk is _RESPONSE_FINISHED:
+                self.finished = True
+                return
+            if chunk:
+                yield chunk
+    
+    def close(self):
+        """Stop the app if the client went away before it finished"""
+        if not self.finished and not self.future.done():
+            _get_loop().call_soon_threadsafe(self._disconnect)
+    
+    def _disconnect(self):
+        """Report the disconnect to the app, then cancel it (on the event loop)"""
+        self.state.disconnected.set()
+        # Scheduled after the waiters woken above, so the app sees the
+        # disconnect before it is cancelled
+        asyncio.get_running_loop().call_soon(self.future.cancel)
+
+
 class WSGItoASGIAdapter:
     """
     WSGI to ASGI adapter for FastAPI to work with gunicorn.
     Based on uvicorn's WSGIMiddleware.
+
+    Deprecated: prefer serving ``asgi:application`` with uvicorn workers.
     """
     
+    __slots__ = ('app',)
+    
     def __init__(self, app):
         self.app = app
     
     def __call__(self, environ, start_response):
         try:
-            # Create a one-time event loop for this request
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
             # Extract relevant WSGI environment variables
+            get = environ.get
             path = environ['PATH_INFO']
-            query_string = environ.get('QUERY_STRING', '').encode()
+            query_string = get('QUERY_STRING', '').encode('latin1')
             method = environ['REQUEST_METHOD']
-            scheme = environ.get('wsgi.url_scheme', 'http')
-            remote_addr = environ.get('REMOTE_ADDR', '')
+            scheme = get('wsgi.url_scheme', 'http')
+            remote_addr = get('REMOTE_ADDR', '')
+            server_name = get('SERVER_NAME', '')
+            server_port = get('SERVER_PORT', 0)
+            if isinstance(server_port, str):
+                server_port = int(server_port or 0)
             
-            # Read the request body
-            content_length = int(environ.get('CONTENT_LENGTH', '0'))
-            body = environ['wsgi.input'].read(content_length) if content_length else b''
+            # The request body is streamed to the app from wsgi.input
+            content_length = int(get('CONTENT_LENGTH') or 0)
+            wsgi_input = environ['wsgi.input']
             
             # Process headers
-            headers = []
-            for key, value in environ.items():
-                if key.startswith('HTTP_'):
-                    name = key[5:].replace('_', '-').lower().encode()
-                    headers.append((name, value.encode()))
-                elif key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
-                    name = key.replace('_', '-').lower().encode()
-                    headers.append((name, value.encode()))
-            
-            # Create ASGI scope
-            scope = {
-                'type': 'http',
-                'asgi': {
-                    'version': '3.0',
-                    'spec_version': '2.1',
-                },
-                'http_version': '1.1',
-                'method': method,
-                'scheme': scheme,
-                'path': path,
-                'query_string': query_string,
-                'headers': headers,
-                'client': (remote_addr, 0),
-                'server': (environ.get('SERVER_NAME', ''), int(environ.get('SERVER_PORT', 0))),
-                'extensions': {},
-            }
+            headers = [
+                (key[5:].encode('latin1').translate(_HEADER_NAME_TRANS), value.encode('latin1'))
+                for key, value in environ.items()
+                if key.startswith('HTTP_')
+            ]
+            for key, name in _SPECIAL_HEADERS:
+                value = get(key)
+                if value is not None:
+                    headers.append((name, value.encode('latin1')))
             
-            # Track response to return to WSGI
-            status_code = None
-            response_headers = None
-            response_body = BytesIO()
+            # Create ASGI scope from the shared template
+            scope = _SCOPE_TEMPLATE.copy()
+            scope.update(
+                method=method,
+                scheme=scheme,
+                path=path,
+                query_string=query_string,
+                headers=headers,
+                client=(remote_addr, 0),
+                server=(server_name, server_port),
+                extensions={},
+            )
             
-            # ASGI receive function
-            async def receive():
-                return {
-                    'type': 'http.request',
-                    'body': body,
-                    'more_body': False,
-                }
-            
-            # ASGI send function
-            async def send(message):
-                nonlocal status_code, response_headers, response_body
-                
-                message_type = message['type']
-                
-                if message_type == 'http.response.start':
-                    status_code = message['status']
-                    response_headers = [
-                        (key.decode('latin1'), value.decode('latin1'))
-                        for key, value in message.get('headers', [])
-                    ]
-                elif message_type == 'http.response.body':
-                    response_body.write(message.get('body', b''))
+            # Track response to return to WSGI; body chunks are handed from
+            # send() to the WSGI server through a queue as they are produced
+            state = _RequestState(wsgi_input, content_length, method == 'HEAD')
+            response_queue = state.queue
             
             # Run the ASGI app
             async def run_asgi():
                 try:
-                    await self.app(scope, receive, send)
+                    await self.app(scope, state.receive, state.send)
                 except Exception as e:
-                    logger.exception(f"Error running ASGI app: {e}")
+                    logger.error(f"Error running ASGI app: {e}", exc_info=logger.isEnabledFor(logging.DEBUG))
                     # Handle the error by setting a 500 status
-                    if status_code is None:
-                        status_code = 500
-                        response_headers = [('Content-Type', 'text/plain')]
-                        response_body.write(b'Internal Server Error')
+                    if state.status is None:
+                        state.status = 500
+                        state.headers = list(_ERROR_HEADERS)
+                        response_queue.put_nowait(_RESPONSE_STARTED)
+                        response_queue.put_nowait(_ERROR_BODY)
+                finally:
+                    state.disconnected.set()
+                    response_queue.put_nowait(_RESPONSE_FINISHED)
+            
+            future = asyncio.run_coroutine_threadsafe(run_asgi(), _get_loop())
             
-            loop.run_until_complete(run_asgi())
+            # Wait until the app has started the response (or finished)
+            item = None
+            while item is not _RESPONSE_STARTED and item is not _RESPONSE_FINISHED:
+                item = response_queue.get()
             
             # Return the WSGI response
-            if status_code is None:
-                status_code = 500
-                response_headers = [('Content-Type', 'text/plain')]
-                response_body.write(b'Internal Server Error')
+            if state.status is None:
+                state.status = 500
+                state.headers = list(_ERROR_HEADERS)
+                response_queue.put_nowait(_ERROR_BODY)
+                response_queue.put_nowait(_RESPONSE_FINISHED)
             
-            start_response(f"{status_code} ", response_headers or [])
-            response_body.seek(0)
-            return [response_body.read()]
+            start_response(f"{state.status} ", state.headers or [])
+            return _ResponseBody(state, future)
             
         except Exception as e:
-            logger.exception(f"Unhandled exception in WSGI adapter: {e}")
-            start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
-            return [b'Internal Server Error']
+            logger.error(f"Unhandled exception in WSGI adapter: {e}", exc_info=logger.isEnabledFor(logging.DEBUG))
+            start_response(_ERROR_STATUS, list(_ERROR_HEADERS))
+            return [_ERROR_BODY]
+
+
+
+# Adapter instance shared by all requests, built on first use so importing
+# this module does not load the FastAPI app
+_adapter = None
 
 
 def wsgi_app(environ, start_response):
     """
-    WSGI entry point for FastAPI.
+    WSGI entry point for the FastAPI app in fastapi_app.py, for legacy
+    deployments such as ``gunicorn adapters:wsgi_app``.
+
+    main.app is the Flask app, which is already a WSGI app and needs no bridge.
     """
-    from main import app
-    adapter = WSGItoASGIAdapter(app)
-    return adapter(environ, start_response)
\ No newline at end of file
+    global _adapter
+    if _adapter is None:
+        from fastapi_app import app
+        _adapter = WSGItoASGIAdapter(app)
+    return _adapter(environ, start_response)
\ No newline at end of file
@@ -11,6 +11,7 @@ class DocumentStatus(str, Enum):
     """Document processing status"""
     PENDING = "pending"
     INDEXING = "indexing"
+    PARTIAL_INDEXED = "partial_indexed"
     INDEXED = "indexed"
     EXTRACTING = "extracting"
     COMPLETED = "completed"
@@ -8,19 +8,32 @@ ChromaDB as a vector database, with rate limiting considerations.
 import os
 import time
 import json
+import shutil
 import logging
 import tempfile
 import asyncio
 import uuid
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Optional, Any, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
+import httpx
+import numpy as np
+
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_community.document_loaders import TextLoader
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+import chromadb
 
 from api.models import DocumentStatus, FieldStatus
+from utils.pdf_extractor import extract_pages_parallel
+from utils.state_store import StateStore
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -39,26 +52,208 @@ if not OPENAI_API_KEY:
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
-# Document storage with metadata
-document_metadata = {}
+# Chat model used for extraction (override with EXTRACTION_MODEL)
+EXTRACTION_MODEL = os.environ.get("EXTRACTION_MODEL", "gpt-4o-mini")
+
+# Maximum tokens of retrieved document text sent with a single-field prompt
+MAX_CONTEXT_TOKENS = 1500
+
+# Documents up to this many tokens are sent to the LLM whole for batch
+# extraction, skipping retrieval entirely
+FULL_CONTEXT_TOKEN_THRESHOLD = int(os.environ.get("FULL_CONTEXT_TOKEN_THRESHOLD", "30000"))
+FULL_TEXT_FILE = "full_text.txt"
+
+# Prompt for extracting one field
+FIELD_PROMPT = ChatPromptTemplate.from_template("""
+        You are an expert data extractor. Extract the value for the field {field_name} from the provided text.
+        
+        Field description: {field_description}
+        
+        Text:
+        {text}
+        
+        Return ONLY the extracted value for {field_name}. If you cannot find the value, return null.
+        If you find a value, include the units if applicable.
+        """)
+
+# Prompt for extracting several fields as one JSON object
+FIELDS_PROMPT = ChatPromptTemplate.from_template("""
+        You are an expert data extractor. Extract the values for the following fields from the provided text.
+        
+        Fields:
+        {fields}
+        
+        Text:
+        {text}
+        
+        Return ONLY a JSON object mapping each field name, exactly as given, to its extracted value.
+        Use null for any field whose value you cannot find. Include the units if applicable.
+        """)
+
+# Shared splitter; LangChain splitters are stateless, so one instance
+# serves every document
+SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    separators=["\n\n", "\n", ".", " ", ""],
+)
+
+# Documents with more characters than this are split with the Rust-based
+# semantic-text-splitter when it is installed
+LARGE_DOCUMENT_CHARS = 200_000
+
+try:
+    from semantic_text_splitter import TextSplitter as FastTextSplitter
+    FAST_SPLITTER = FastTextSplitter(CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+except ImportError:
+    FAST_SPLITTER = None
+
+# Number of texts sent per embeddings API request
+EMBEDDING_BATCH_SIZE = 512
+
+# Number of texts per concurrent embedding call on the indexing path
+EMBEDDING_REQUEST_SIZE = 256
+
+# Indexing pipeline: embedded batches waiting to be written to Chroma, and the
+# number of written chunks after which extraction may start on a document
+INDEX_QUEUE_SIZE = 32
+PARTIAL_INDEX_MIN_CHUNKS = int(os.environ.get("PARTIAL_INDEX_MIN_CHUNKS", "64"))
 
-# Document status tracking
-document_statuses = {}
+# Searches on a partially indexed document retrieve this many times more
+# chunks, to make up for the chunks not yet written
+PARTIAL_SEARCH_K_FACTOR = 2
+
+# Document statuses from which fields can be extracted
+EXTRACTABLE_STATUSES = frozenset((
+    DocumentStatus.PARTIAL_INDEXED,
+    DocumentStatus.INDEXED,
+    DocumentStatus.COMPLETED,
+))
+
+# Document storage with metadata, shared by all worker processes. Store calls
+# are blocking SQLite transactions that can wait on other workers' writes, so
+# async code runs them in worker threads via asyncio.to_thread.
+document_metadata = StateStore("vector_documents")
+
+# Document status tracking, shared by all worker processes
+document_statuses = StateStore("vector_document_statuses")
 
 # Rate limiting configuration
 RATE_LIMIT_TOKENS_PER_MIN = 90000  # OpenAI rate limit for tokens per minute
+RATE_LIMIT_REQUESTS_PER_MIN = 500  # OpenAI rate limit for requests per minute
 MAX_PARALLEL_REQUESTS = 5  # Maximum parallel requests to OpenAI API
-RATE_LIMIT_DELAY = 0.5  # Delay between API requests in seconds
+
+# Rough token cost of an extraction request beyond its retrieved chunks
+# (prompt template, field descriptions and the completion)
+PROMPT_OVERHEAD_TOKENS = 500
 
 # Semaphore for rate limiting
 api_semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
 
-# Thread pool for CPU-bound tasks
+
+class TokenBucket:
+    """
+    Request and token budget for the OpenAI API, refilled continuously at the
+    per-minute rate limits. Callers wait only when the budget is exhausted.
+    """
+    
+    def __init__(self, requests_per_min: int, tokens_per_min: int):
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+        self.available_requests = float(requests_per_min)
+        self.available_tokens = float(tokens_per_min)
+        self.last_update = time.monotonic()
+    
+    def _replenish(self):
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.last_update = now
+        self.available_requests = min(
+            self.requests_per_min,
+            self.available_requests + elapsed * self.requests_per_min / 60
+        )
+        self.available_tokens = min(
+            self.tokens_per_min,
+            self.available_tokens + elapsed * self.tokens_per_min / 60
+        )
+    
+    async def acquire(self, tokens: int):
+        """Wait until one request and the given number of tokens are available"""
+        tokens = min(tokens, self.tokens_per_min)
+        while True:
+            self._replenish()
+            if self.available_requests >= 1 and self.available_tokens >= tokens:
+                self.available_requests -= 1
+                self.available_tokens -= tokens
+                return
+            
+            # Sleep until the scarcer budget should have refilled
+            wait = max(
+                (1 - self.available_requests) * 60 / self.requests_per_min,
+                (tokens - self.available_tokens) * 60 / self.tokens_per_min,
+                0.01
+            )
+            await asyncio.sleep(wait)
+
+
+rate_limiter = TokenBucket(RATE_LIMIT_REQUESTS_PER_MIN, RATE_LIMIT_TOKENS_PER_MIN)
+
+
+def estimate_request_tokens(num_chunks: int) -> int:
+    """Estimate the tokens of an extraction request over num_chunks retrieved chunks"""
+    # About four characters per token for English text
+    return num_chunks * CHUNK_SIZE // 4 + PROMPT_OVERHEAD_TOKENS
+
+# Thread pool for CPU-bound tasks (document loading and splitting)
 thread_pool = ThreadPoolExecutor(max_workers=4)
 
+# Strong references to fire-and-forget extraction tasks; the event loop only
+# keeps weak references, so unreferenced tasks can vanish mid-run
+_background_tasks = set()
+
+# Embeddings client and Chroma handles, created once and shared by the
+# thread pool workers. All collections share one persistent Chroma client.
+_embeddings_singleton = None
+_chroma_client = None
+_vector_store_cache: Dict[str, Chroma] = {}
+_cache_lock = threading.Lock()
+
+# Per-document in-memory search data: (indexed_at, (L2-normalised float32
+# vectors, texts, metadatas)). Documents have their own small collections, so
+# a flat dot product over all chunks is faster than a Chroma query and needs
+# no disk I/O. indexed_at comes from the shared document metadata, so a worker
+# reloads the index when another worker re-indexes the document.
+_flat_indexes: Dict[str, Tuple[Optional[float], Tuple[np.ndarray, List[str], List[Dict[str, Any]]]]] = {}
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+
+# LRU cache of search results keyed by (document_id, indexed_at, query, k), so
+# fields that repeat a query skip the query embedding and the search. Keying on
+# indexed_at makes results cached by other workers miss after a re-index.
+SEARCH_CACHE_SIZE = 1024
+_search_cache: "OrderedDict[Tuple[str, Optional[float], str, int], Tuple[Document, ...]]" = OrderedDict()
+
+# LRU cache of query embeddings keyed by query text. Queries are built from
+# field names and descriptions only, so the same field extracted from many
+# documents is embedded once.
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+_query_embedding_cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+
 
 def get_embeddings():
-    """Get OpenAI embeddings model with error handling"""
+    """Get the shared OpenAI embeddings model, creating it on first use"""
+    global _embeddings_singleton
+    if _embeddings_singleton is not None:
+        return _embeddings_singleton
+    
+    with _cache_lock:
+        if _embeddings_singleton is None:
+            _embeddings_singleton = _create_embeddings()
+    return _embeddings_singleton
+
+
+def _create_embeddings():
+    """Create an OpenAI embeddings model with error handling"""
     try:
         # Try to use Azure OpenAI if configured
         if os.environ.get("AZURE_OPENAI_API_KEY") and os.environ.get("AZURE_OPENAI_ENDPOINT"):
@@ -68,26 +263,113 @@ def get_embeddings():
                 openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),
                 azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
                 api_key=os.environ.get("AZURE_OPENAI_API_KEY"),
+                chunk_size=EMBEDDING_BATCH_SIZE,
             )
         else:
             # Fall back to standard OpenAI
-            return OpenAIEmbeddings()
+            return OpenAIEmbeddings(chunk_size=EMBEDDING_BATCH_SIZE)
     except Exception as e:
         logger.error(f"Error initializing embeddings: {str(e)}")
         raise
 
 
+# Async HTTP client shared by all extraction calls, so connections to the
+# OpenAI API are kept alive and reused
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+_async_http_client = httpx.AsyncClient(timeout=60, limits=HTTP_LIMITS)
+
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """Get the shared extraction chat model"""
+    return ChatOpenAI(temperature=0, model=EXTRACTION_MODEL, http_async_client=_async_http_client)
+
+
+@lru_cache(maxsize=1)
+def get_field_chain():
+    """Get the single-field extraction chain, composed once"""
+    return FIELD_PROMPT | get_llm()
+
+
+@lru_cache(maxsize=1)
+def get_fields_chain():
+    """Get the multi-field extraction chain, composed once"""
+    return FIELDS_PROMPT | get_llm() | JsonOutputParser()
+
+
+@lru_cache(maxsize=1)
+def _get_token_encoding():
+    """Get the tokenizer for the extraction model, or None without tiktoken"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(EXTRACTION_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of text for the extraction model"""
+    encoding = _get_token_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens tokens of the extraction model"""
+    encoding = _get_token_encoding()
+    if encoding is None:
+        # Roughly four characters per token
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def get_chroma_client():
+    """Get the shared persistent Chroma client, creating it on first use"""
+    global _chroma_client
+    if _chroma_client is None:
+        with _cache_lock:
+            if _chroma_client is None:
+                _chroma_client = chromadb.PersistentClient(path=VECTOR_STORE_DIR)
+    return _chroma_client
+
+
+def get_collection(collection_name):
+    """
+    Get a raw Chroma collection through the shared client, creating it if needed
+    
+    Embeddings are computed by the caller, so the collection has no embedding
+    function, as with the collections LangChain's Chroma wrapper creates.
+    """
+    return get_chroma_client().get_or_create_collection(name=collection_name, embedding_function=None)
+
+
 def get_vector_store(collection_name):
-    """Get vector store for the given collection name"""
+    """Get the cached vector store for the given collection name"""
+    vector_store = _vector_store_cache.get(collection_name)
+    if vector_store is not None:
+        return vector_store
+    
     try:
         embeddings = get_embeddings()
+        client = get_chroma_client()
         
-        # Create a persistent ChromaDB instance
-        vector_store = Chroma(
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=VECTOR_STORE_DIR
-        )
+        with _cache_lock:
+            vector_store = _vector_store_cache.get(collection_name)
+            if vector_store is None:
+                # Open the collection through the shared persistent client
+                vector_store = Chroma(
+                    client=client,
+                    collection_name=collection_name,
+                    embedding_function=embeddings
+                )
+                _vector_store_cache[collection_name] = vector_store
         
         return vector_store
     except Exception as e:
@@ -102,23 +384,32 @@ def generate_document_id() -> str:
 
 def update_document_status(document_id: str, status: DocumentStatus, error: Optional[str] = None):
     """Update document status"""
-    if document_id not in document_statuses:
+    changes = {"status": status}
+    if error:
+        changes["error"] = error
+    
+    if document_statuses.update(document_id, **changes) is None:
         document_statuses[document_id] = {
             "document_id": document_id,
             "status": status,
             "field_statuses": {},
             "error": error
         }
-    else:
-        document_statuses[document_id]["status"] = status
-        if error:
-            document_statuses[document_id]["error"] = error
 
 
 def update_field_status(document_id: str, field_name: str, status: FieldStatus, error: Optional[str] = None):
     """Update field extraction status"""
-    if document_id in document_statuses:
-        document_statuses[document_id]["field_statuses"][field_name] = status
+    update_field_statuses(document_id, [field_name], status)
+
+
+def update_field_statuses(document_id: str, field_names: List[str], status: FieldStatus):
+    """Set the extraction status of several fields in a single write"""
+    # No-op if the document is unknown
+    document_statuses.update_fields(
+        document_id,
+        dict.fromkeys(field_names, status),
+        container="field_statuses"
+    )
 
 
 def get_document_status(document_id: str) -> Optional[Dict[str, Any]]:
@@ -126,6 +417,12 @@ def get_document_status(document_id: str) -> Optional[Dict[str, Any]]:
     return document_statuses.get(document_id)
 
 
+def _write_document_file(document_dir: str, file_path: str, file_content: bytes) -> None:
+    os.makedirs(document_dir, exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(file_content)
+
+
 async def upload_document(file_content: bytes, file_name: str, document_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Upload a document to the system
@@ -144,30 +441,25 @@ async def upload_document(file_content: bytes, file_name: str, document_id: Opti
             document_id = generate_document_id()
         
         # Store document metadata
-        document_metadata[document_id] = {
+        await asyncio.to_thread(document_metadata.set, document_id, {
             "filename": file_name,
             "upload_time": time.time(),
             "status": DocumentStatus.PENDING
-        }
+        })
         
         # Update document status
-        update_document_status(document_id, DocumentStatus.PENDING)
+        await asyncio.to_thread(update_document_status, document_id, DocumentStatus.PENDING)
         
-        # Create document directory
+        # Create the document directory and save the content off the event loop
         document_dir = os.path.join(VECTOR_STORE_DIR, document_id)
-        os.makedirs(document_dir, exist_ok=True)
-        
-        # Save document content
         file_path = os.path.join(document_dir, file_name)
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        # Store file path in metadata
-        document_metadata[document_id]["file_path"] = file_path
+        await asyncio.to_thread(_write_document_file, document_dir, file_path, file_content)
         
         # Detect file type
         is_text_file = file_name.lower().endswith('.txt')
-        document_metadata[document_id]["is_text_file"] = is_text_file
+        
+        # Store file path and type in metadata
+        await asyncio.to_thread(document_metadata.update, document_id, file_path=file_path, is_text_file=is_text_file)
         
         return {
             "success": True,
@@ -194,8 +486,9 @@ async def index_document(document_id: str) -> Dict[str, Any]:
         Dictionary with indexing results
     """
     try:
-        # Check if document exists
-        if document_id not in document_metadata:
+        # Get document metadata, checking the document exists
+        metadata = await asyncio.to_thread(document_metadata.get, document_id)
+        if metadata is None:
             return {
                 "success": False,
                 "document_id": document_id,
@@ -204,10 +497,8 @@ async def index_document(document_id: str) -> Dict[str, Any]:
             }
         
         # Update document status
-        update_document_status(document_id, DocumentStatus.INDEXING)
+        await asyncio.to_thread(update_document_status, document_id, DocumentStatus.INDEXING)
         
-        # Get document metadata
-        metadata = document_metadata[document_id]
         file_path = metadata["file_path"]
         is_text_file = metadata.get("is_text_file", file_path.lower().endswith('.txt'))
         
@@ -215,27 +506,38 @@ async def index_document(document_id: str) -> Dict[str, Any]:
         loop = asyncio.get_event_loop()
         
         try:
-            # Index the document in a separate thread
-            result = await loop.run_in_executor(
+            start_time = time.time()
+            
+            # Load and split the document in a separate thread
+            loaded = await loop.run_in_executor(
                 thread_pool, 
-                lambda: _index_document_worker(document_id, file_path, is_text_file)
+                lambda: _load_document_worker(document_id, file_path, is_text_file)
             )
             
+            if loaded["success"]:
+                result = await _add_chunks(document_id, loaded["texts"], loaded["metadatas"])
+                result["pages"] = loaded["pages"]
+                result["processing_time"] = time.time() - start_time
+                logger.info(f"Document {document_id} added to vector store with {result['chunks']} chunks in {result['processing_time']:.2f} seconds")
+            else:
+                result = loaded
+            
             # Update status based on result
             if result["success"]:
-                update_document_status(document_id, DocumentStatus.INDEXED)
+                await asyncio.to_thread(update_document_status, document_id, DocumentStatus.INDEXED)
             else:
-                update_document_status(document_id, DocumentStatus.FAILED, result["error"])
+                await asyncio.to_thread(update_document_status, document_id, DocumentStatus.FAILED, result["error"])
             
             # Add status to result
-            result["status"] = document_statuses[document_id]["status"]
+            status = await asyncio.to_thread(get_document_status, document_id)
+            result["status"] = status["status"]
             
             return result
         
         except Exception as e:
             error_message = f"Error indexing document: {str(e)}"
             logger.error(error_message)
-            update_document_status(document_id, DocumentStatus.FAILED, error_message)
+            await asyncio.to_thread(update_document_status, document_id, DocumentStatus.FAILED, error_message)
             
             return {
                 "success": False,
@@ -247,7 +549,7 @@ async def index_document(document_id: str) -> Dict[str, Any]:
     except Exception as e:
         error_message = f"Error in index_document: {str(e)}"
         logger.error(error_message)
-        update_document_status(document_id, DocumentStatus.FAILED, error_message)
+        await asyncio.to_thread(update_document_status, document_id, DocumentStatus.FAILED, error_message)
         
         return {
             "success": False,
@@ -257,12 +559,31 @@ async def index_document(document_id: str) -> Dict[str, Any]:
         }
 
 
-def _index_document_worker(document_id: str, file_path: str, is_text_file: bool) -> Dict[str, Any]:
-    """Worker function for document indexing to be run in a separate thread"""
+def split_pages(pages: List[Document]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Split loaded pages into chunks, keeping each page's metadata
+    
+    Returns:
+        Parallel lists of chunk texts and metadatas. Chunks of the same page
+        share one metadata dict.
+    """
+    if FAST_SPLITTER is not None and sum(len(page.page_content) for page in pages) > LARGE_DOCUMENT_CHARS:
+        split = FAST_SPLITTER.chunks
+    else:
+        split = SPLITTER.split_text
+    
+    texts = []
+    metadatas = []
+    for page in pages:
+        page_texts = split(page.page_content)
+        texts.extend(page_texts)
+        metadatas.extend([page.metadata] * len(page_texts))
+    return texts, metadatas
+
+
+def _load_document_worker(document_id: str, file_path: str, is_text_file: bool) -> Dict[str, Any]:
+    """Worker function loading and splitting a document, to be run in a separate thread"""
     try:
-        start_time = time.time()
-        collection_name = f"doc_{document_id}"
-        
         # Load document with the appropriate loader
         if is_text_file:
             logger.info(f"Loading text file {file_path}")
@@ -270,47 +591,44 @@ def _index_document_worker(document_id: str, file_path: str, is_text_file: bool)
             pages = loader.load()
         else:
             logger.info(f"Loading PDF file {file_path}")
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
+            # Large PDFs are parsed page-parallel across processes
+            pages = [
+                Document(page_content=text, metadata={"source": file_path, "page": page_num})
+                for page_num, text in enumerate(extract_pages_parallel(file_path))
+            ]
         
-        # Update metadata
-        document_metadata[document_id].update({
-            "pages": len(pages),
-            "indexed_at": time.time()
-        })
+        # Keep the full text of small documents so batch extraction can send
+        # it whole instead of retrieving chunks
+        full_text = "\n\n".join(page.page_content for page in pages)
+        total_tokens = count_tokens(full_text)
+        skip_retrieval = total_tokens <= FULL_CONTEXT_TOKEN_THRESHOLD
+        if skip_retrieval:
+            document_dir = os.path.join(VECTOR_STORE_DIR, document_id)
+            os.makedirs(document_dir, exist_ok=True)
+            with open(os.path.join(document_dir, FULL_TEXT_FILE), 'w', encoding='utf-8') as f:
+                f.write(full_text)
         
-        # Split the document into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ".", " ", ""],
+        # Update metadata
+        document_metadata.update(
+            document_id,
+            pages=len(pages),
+            indexed_at=time.time(),
+            tokens=total_tokens,
+            skip_retrieval=skip_retrieval
         )
         
-        chunks = text_splitter.split_documents(pages)
+        # Split the document into chunks
+        texts, metadatas = split_pages(pages)
         
         # Update metadata
-        document_metadata[document_id]["chunks"] = len(chunks)
-        
-        # Initialize vector store
-        vector_store = get_vector_store(collection_name)
-        
-        # Add chunks to vector store
-        vector_store.add_documents(chunks)
-        
-        # Persist the vector store
-        if hasattr(vector_store, 'persist'):
-            vector_store.persist()
-        
-        processing_time = time.time() - start_time
-        
-        logger.info(f"Document {document_id} added to vector store with {len(chunks)} chunks in {processing_time:.2f} seconds")
+        document_metadata.update(document_id, chunks=len(texts))
         
         return {
             "success": True,
             "document_id": document_id,
-            "chunks": len(chunks),
-            "pages": len(pages),
-            "processing_time": processing_time
+            "texts": texts,
+            "metadatas": metadatas,
+            "pages": len(pages)
         }
     
     except Exception as e:
@@ -322,6 +640,235 @@ def _index_document_worker(document_id: str, file_path: str, is_text_file: bool)
         }
 
 
+async def _gather_or_cancel(*aws):
+    """Like asyncio.gather, but cancels the remaining awaitables when one fails"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _add_chunks(document_id: str, texts: List[str], metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Embed a document's chunks and add them to its Chroma collection
+    
+    Embedding and writing are pipelined: each embedded batch is queued and
+    written to Chroma while later batches are still being embedded. Once
+    PARTIAL_INDEX_MIN_CHUNKS chunks are written the document is marked
+    PARTIAL_INDEXED, so extraction can start before indexing finishes.
+    
+    Embeddings are copied into one preallocated float32 matrix as they
+    arrive, rather than kept as lists of Python floats.
+    """
+    matrix: Optional[np.ndarray] = None
+    
+    embeddings = get_embeddings()
+    collection = await asyncio.to_thread(get_collection, f"doc_{document_id}")
+    loop = asyncio.get_event_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=INDEX_QUEUE_SIZE)
+    
+    async def embed_batch(start: int):
+        async with api_semaphore:
+            batch_vectors = await embeddings.aembed_documents(texts[start:start + EMBEDDING_REQUEST_SIZE])
+        await queue.put((start, batch_vectors))
+    
+    async def write_batches():
+        nonlocal matrix
+        # Keep draining after a failed write so the embedders never block
+        error = None
+        written = 0
+        partial = False
+        while (item := await queue.get()) is not None:
+            if error is not None:
+                continue
+            start, batch_vectors = item
+            end = start + len(batch_vectors)
+            if matrix is None:
+                matrix = np.empty((len(texts), len(batch_vectors[0])), dtype=np.float32)
+            matrix[start:end] = batch_vectors
+            try:
+                await loop.run_in_executor(
+                    thread_pool,
+                    lambda: collection.add(
+                        ids=[uuid.uuid4().hex for _ in batch_vectors],
+                        embeddings=batch_vectors,
+                        documents=texts[start:end],
+                        metadatas=metadatas[start:end],
+                    )
+                )
+            except Exception as e:
+                error = e
+                continue
+            
+            written += len(batch_vectors)
+            if PARTIAL_INDEX_MIN_CHUNKS <= written < len(texts) and not partial:
+                partial = True
+                await asyncio.to_thread(update_document_status, document_id, DocumentStatus.PARTIAL_INDEXED)
+        
+        if error is not None:
+            raise error
+    
+    # The writer drains the queue until it gets None, so the embedders never
+    # block on a full queue while it runs. If an embedding request fails, the
+    # other embedders are cancelled and the writer is stopped.
+    writer = asyncio.ensure_future(write_batches())
+    try:
+        await _gather_or_cancel(*[
+            embed_batch(start) for start in range(0, len(texts), EMBEDDING_REQUEST_SIZE)
+        ])
+        await queue.put(None)
+        await writer
+    finally:
+        if not writer.done():
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+    
+    # Chroma >= 0.4 writes through to its persist directory on every add,
+    # so no explicit persist() flush is needed here
+    
+    # Keep a flat copy of the vectors for in-memory search
+    if matrix is None:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    await loop.run_in_executor(
+        thread_pool,
+        lambda: _save_flat_index(document_id, matrix, texts, metadatas)
+    )
+    _clear_search_cache(document_id)
+    
+    return {
+        "success": True,
+        "document_id": document_id,
+        "chunks": len(texts)
+    }
+
+
+def _save_flat_index(document_id: str, vectors, texts: List[str], metadatas: List[Dict[str, Any]]):
+    """Save and cache a document's normalised vectors and chunk texts"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    
+    document_dir = os.path.join(VECTOR_STORE_DIR, document_id)
+    os.makedirs(document_dir, exist_ok=True)
+    np.save(os.path.join(document_dir, VECTORS_FILE), matrix)
+    with open(os.path.join(document_dir, CHUNKS_FILE), 'w') as f:
+        json.dump({"texts": texts, "metadatas": metadatas}, f)
+    
+    _flat_indexes[document_id] = (_indexed_at(document_id), (matrix, texts, metadatas))
+
+
+def _indexed_at(document_id: str) -> Optional[float]:
+    """Shared version of a document's index; changes when it is re-indexed"""
+    return document_metadata.get(document_id, {}).get("indexed_at")
+
+
+def _load_flat_index(document_id: str, indexed_at: Optional[float] = None):
+    """
+    Get a document's flat index, loading it from disk if needed; None if absent
+    
+    The cached copy is reloaded when it was built for a different indexed_at,
+    i.e. another worker has re-indexed the document since.
+    """
+    cached = _flat_indexes.get(document_id)
+    if cached is not None and cached[0] == indexed_at:
+        return cached[1]
+    
+    document_dir = os.path.join(VECTOR_STORE_DIR, document_id)
+    vectors_path = os.path.join(document_dir, VECTORS_FILE)
+    chunks_path = os.path.join(document_dir, CHUNKS_FILE)
+    if not (os.path.exists(vectors_path) and os.path.exists(chunks_path)):
+        return None
+    
+    matrix = np.load(vectors_path)
+    with open(chunks_path) as f:
+        chunks = json.load(f)
+    index = (matrix, chunks["texts"], chunks["metadatas"])
+    _flat_indexes[document_id] = (indexed_at, index)
+    return index
+
+
+def _clear_search_cache(document_id: str):
+    """Drop cached search results for a document"""
+    for key in [key for key in _search_cache if key[0] == document_id]:
+        _search_cache.pop(key, None)
+
+
+async def similarity_search(document_id: str, query: str, k: int) -> List[Document]:
+    """
+    Find the k chunks of a document most similar to the query
+    
+    Results are served from an LRU cache when the same query was run before.
+    Documents still being indexed are searched with a larger k and are not
+    cached, as their results change as chunks are written. Both checks use
+    the shared document status and metadata, as indexing may run in another
+    worker process.
+    """
+    status = await asyncio.to_thread(get_document_status, document_id) or {}
+    indexed_at = await asyncio.to_thread(_indexed_at, document_id)
+    if status.get("status") == DocumentStatus.PARTIAL_INDEXED:
+        return await _chroma_search(document_id, query, k * PARTIAL_SEARCH_K_FACTOR)
+    
+    key = (document_id, indexed_at, query, k)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        _search_cache.move_to_end(key)
+        return list(cached)
+    
+    results = await _similarity_search(document_id, query, k, indexed_at)
+    _search_cache[key] = tuple(results)
+    if len(_search_cache) > SEARCH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
+    return results
+
+
+async def embed_query(query: str) -> Tuple[float, ...]:
+    """Embed a search query, reusing the embedding of an identical earlier query"""
+    cached = _query_embedding_cache.get(query)
+    if cached is not None:
+        _query_embedding_cache.move_to_end(query)
+        return cached
+    
+    embedding = tuple(await get_embeddings().aembed_query(query))
+    _query_embedding_cache[query] = embedding
+    if len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+        _query_embedding_cache.popitem(last=False)
+    return embedding
+
+
+async def _chroma_search(document_id: str, query: str, k: int) -> List[Document]:
+    """Search a document's Chroma collection, which holds every chunk written so far"""
+    vector_store = get_vector_store(f"doc_{document_id}")
+    return await vector_store.asimilarity_search_by_vector(list(await embed_query(query)), k=k)
+
+
+async def _similarity_search(document_id: str, query: str, k: int, indexed_at: Optional[float] = None) -> List[Document]:
+    """
+    Search a document's chunks without the result cache
+    
+    Uses the document's in-memory flat index when one exists, and falls back
+    to the Chroma collection for documents indexed before it was kept.
+    """
+    index = _load_flat_index(document_id, indexed_at)
+    if index is None:
+        return await _chroma_search(document_id, query, k)
+    
+    matrix, texts, metadatas = index
+    if len(texts) == 0:
+        return []
+    
+    query_vector = np.array(await embed_query(query), dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) or 1
+    scores = matrix @ query_vector
+    
+    k = min(k, len(texts))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [Document(page_content=texts[i], metadata=metadatas[i]) for i in top]
+
+
 async def extract_field(document_id: str, field_name: str, field_description: Optional[str] = None) -> Dict[str, Any]:
     """
     Extract a single field from a document with rate limiting
@@ -336,7 +883,7 @@ async def extract_field(document_id: str, field_name: str, field_description: Op
     """
     try:
         # Check if document exists
-        if document_id not in document_metadata:
+        if not await asyncio.to_thread(document_metadata.__contains__, document_id):
             return {
                 "success": False,
                 "document_id": document_id,
@@ -346,8 +893,8 @@ async def extract_field(document_id: str, field_name: str, field_description: Op
             }
         
         # Check if document is indexed
-        status = document_statuses.get(document_id, {}).get("status")
-        if status != DocumentStatus.INDEXED and status != DocumentStatus.COMPLETED:
+        status = (await asyncio.to_thread(get_document_status, document_id) or {}).get("status")
+        if status not in EXTRACTABLE_STATUSES:
             return {
                 "success": False,
                 "document_id": document_id,
@@ -357,44 +904,9 @@ async def extract_field(document_id: str, field_name: str, field_description: Op
             }
         
         # Update field status
-        update_field_status(document_id, field_name, FieldStatus.PROCESSING)
+        await asyncio.to_thread(update_field_status, document_id, field_name, FieldStatus.PROCESSING)
         
-        # Use a semaphore to limit concurrent requests to the OpenAI API
-        async with api_semaphore:
-            # Rate limiting: add a small delay
-            await asyncio.sleep(RATE_LIMIT_DELAY)
-            
-            try:
-                # Extract the field using a CPU-bound thread
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    thread_pool,
-                    lambda: _extract_field_worker(document_id, field_name, field_description)
-                )
-                
-                # Update field status based on result
-                if result["success"]:
-                    update_field_status(document_id, field_name, FieldStatus.COMPLETED)
-                else:
-                    update_field_status(document_id, field_name, FieldStatus.FAILED)
-                
-                # Add status to result
-                result["status"] = document_statuses[document_id]["field_statuses"].get(field_name, FieldStatus.FAILED)
-                
-                return result
-            
-            except Exception as e:
-                error_message = f"Error extracting field {field_name}: {str(e)}"
-                logger.error(error_message)
-                update_field_status(document_id, field_name, FieldStatus.FAILED)
-                
-                return {
-                    "success": False,
-                    "document_id": document_id,
-                    "field_name": field_name,
-                    "error": error_message,
-                    "status": FieldStatus.FAILED
-                }
+        return await _extract_and_record_field(document_id, field_name, field_description)
     
     except Exception as e:
         error_message = f"Error in extract_field: {str(e)}"
@@ -409,18 +921,47 @@ async def extract_field(document_id: str, field_name: str, field_description: Op
         }
 
 
-def _extract_field_worker(document_id: str, field_name: str, field_description: Optional[str] = None) -> Dict[str, Any]:
-    """Worker function for field extraction to be run in a separate thread"""
-    try:
-        collection_name = f"doc_{document_id}"
-        vector_store = get_vector_store(collection_name)
+async def _extract_and_record_field(document_id: str, field_name: str, field_description: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract one field under the API rate limits and record its final status
+    
+    The field status is set to COMPLETED or FAILED from the extraction result.
+    """
+    # Use a semaphore to limit concurrent requests to the OpenAI API
+    async with api_semaphore:
+        # Rate limiting: wait only if the token budget is exhausted
+        await rate_limiter.acquire(estimate_request_tokens(3))
         
+        try:
+            # Extract the field on the event loop; the LLM call is network I/O
+            result = await _extract_field_async(document_id, field_name, field_description)
+        except Exception as e:
+            error_message = f"Error extracting field {field_name}: {str(e)}"
+            logger.error(error_message)
+            result = {
+                "success": False,
+                "document_id": document_id,
+                "field_name": field_name,
+                "error": error_message
+            }
+    
+    # Update field status based on result
+    status = FieldStatus.COMPLETED if result["success"] else FieldStatus.FAILED
+    await asyncio.to_thread(update_field_status, document_id, field_name, status)
+    result["status"] = status
+    
+    return result
+
+
+async def _extract_field_async(document_id: str, field_name: str, field_description: Optional[str] = None) -> Dict[str, Any]:
+    """Extract one field with an async retrieval and LLM call"""
+    try:
         # Create a targeted query for this field
         description = field_description or f"Information about {field_name}"
         query = f"Extract information about {field_name}: {description}"
         
         # Retrieve relevant chunks from vector store for this field
-        relevant_chunks = vector_store.similarity_search(query, k=3)
+        relevant_chunks = await similarity_search(document_id, query, k=3)
         
         if not relevant_chunks:
             return {
@@ -431,34 +972,14 @@ def _extract_field_worker(document_id: str, field_name: str, field_description:
                 "message": "No relevant content found for this field"
             }
         
-        # Combine the text from all chunks
-        combined_text = "\n\n".join([chunk.page_content for chunk in relevant_chunks])
+        # Combine the text from all chunks, capped to the context token budget
+        combined_text = truncate_to_tokens(
+            "\n\n".join([chunk.page_content for chunk in relevant_chunks]),
+            MAX_CONTEXT_TOKENS
+        )
         
         # Extract the specific field from the combined text using LangChain and OpenAI
-        from langchain_openai import ChatOpenAI
-        from langchain_core.prompts import ChatPromptTemplate
-        
-        # Create a prompt for extracting the field
-        prompt = ChatPromptTemplate.from_template("""
-        You are an expert data extractor. Extract the value for the field {field_name} from the provided text.
-        
-        Field description: {field_description}
-        
-        Text:
-        {text}
-        
-        Return ONLY the extracted value for {field_name}. If you cannot find the value, return null.
-        If you find a value, include the units if applicable.
-        """)
-        
-        # Create a chat model
-        llm = ChatOpenAI(temperature=0, model="gpt-4o")
-        
-        # Create a chain
-        chain = prompt | llm
-        
-        # Extract the value
-        result = chain.invoke({
+        result = await get_field_chain().ainvoke({
             "field_name": field_name,
             "field_description": description,
             "text": combined_text
@@ -479,7 +1000,7 @@ def _extract_field_worker(document_id: str, field_name: str, field_description:
         }
     
     except Exception as e:
-        logger.error(f"Error in extraction worker: {str(e)}")
+        logger.error(f"Error extracting field {field_name}: {str(e)}")
         return {
             "success": False,
             "document_id": document_id,
@@ -488,6 +1009,118 @@ def _extract_field_worker(document_id: str, field_name: str, field_description:
         }
 
 
+def _read_full_text(document_id: str) -> str:
+    with open(os.path.join(VECTOR_STORE_DIR, document_id, FULL_TEXT_FILE), encoding='utf-8') as f:
+        return f.read()
+
+
+async def _extract_fields_batch_async(document_id: str, fields: List[Dict[str, str]], use_full_text: bool = False) -> Dict[str, Any]:
+    """
+    Extract several fields with one async retrieval and one async LLM call
+    
+    With use_full_text, the whole document text is sent instead of retrieved chunks.
+    """
+    try:
+        # Describe every field and build one query covering all of them
+        field_lines = []
+        for field in fields:
+            description = field.get("description") or f"Information about {field['name']}"
+            field_lines.append(f"- {field['name']}: {description}")
+        
+        if use_full_text:
+            combined_text = await asyncio.to_thread(_read_full_text, document_id)
+        else:
+            query = "Extract information about " + "; ".join(line[2:] for line in field_lines)
+            
+            # Retrieve relevant chunks from vector store for all fields at once
+            relevant_chunks = await similarity_search(document_id, query, k=6)
+            
+            if not relevant_chunks:
+                return {
+                    "success": True,
+                    "document_id": document_id,
+                    "values": {field["name"]: None for field in fields},
+                    "message": "No relevant content found for these fields"
+                }
+            
+            # Combine the text from all chunks, capped to the context token budget
+            # (doubled, as twice as many chunks are retrieved for a batch)
+            combined_text = truncate_to_tokens(
+                "\n\n".join([chunk.page_content for chunk in relevant_chunks]),
+                2 * MAX_CONTEXT_TOKENS
+            )
+        
+        # Extract the values
+        result = await get_fields_chain().ainvoke({
+            "fields": "\n".join(field_lines),
+            "text": combined_text
+        })
+        
+        return {
+            "success": True,
+            "document_id": document_id,
+            "values": {field["name"]: result.get(field["name"]) for field in fields}
+        }
+    
+    except Exception as e:
+        logger.error(f"Error in batch extraction: {str(e)}")
+        return {
+            "success": False,
+            "document_id": document_id,
+            "error": f"Error extracting fields: {str(e)}"
+        }
+
+
+async def extract_fields(document_id: str, fields: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Extract several fields from a document with a single LLM call
+    
+    Falls back to extracting each field separately if the combined call fails.
+    
+    Args:
+        document_id: ID of the document
+        fields: List of fields to extract
+        
+    Returns:
+        Dictionary with extraction results
+    """
+    field_names = [field["name"] for field in fields]
+    await asyncio.to_thread(update_field_statuses, document_id, field_names, FieldStatus.PROCESSING)
+    
+    # Small documents are sent whole rather than retrieved from
+    metadata = await asyncio.to_thread(document_metadata.get, document_id) or {}
+    use_full_text = bool(metadata.get("skip_retrieval"))
+    if use_full_text:
+        estimated_tokens = metadata.get("tokens", 0) + PROMPT_OVERHEAD_TOKENS
+    else:
+        estimated_tokens = estimate_request_tokens(6)
+    
+    # Use a semaphore to limit concurrent requests to the OpenAI API
+    async with api_semaphore:
+        # Rate limiting: wait only if the token budget is exhausted
+        await rate_limiter.acquire(estimated_tokens + 50 * len(fields))
+        
+        result = await _extract_fields_batch_async(document_id, fields, use_full_text)
+    
+    if not result["success"]:
+        logger.warning(f"Combined extraction failed for document {document_id}, extracting fields separately")
+        # The document is EXTRACTING by now, so extract_field would refuse it;
+        # extract each field directly, recording its own status
+        results = await asyncio.gather(*[
+            _extract_and_record_field(document_id, field["name"], field.get("description"))
+            for field in fields
+        ])
+        return {
+            "success": all(r["success"] for r in results),
+            "document_id": document_id,
+            "values": {r["field_name"]: r.get("value") for r in results}
+        }
+    
+    await asyncio.to_thread(update_field_statuses, document_id, field_names, FieldStatus.COMPLETED)
+    
+    return result
+
+
 async def batch_extract_fields(document_id: str, fields: List[Dict[str, str]]) -> Dict[str, Any]:
     """
     Start batch extraction of multiple fields from a document
@@ -501,7 +1134,7 @@ async def batch_extract_fields(document_id: str, fields: List[Dict[str, str]]) -
     """
     try:
         # Check if document exists
-        if document_id not in document_metadata:
+        if not await asyncio.to_thread(document_metadata.__contains__, document_id):
             return {
                 "success": False,
                 "document_id": document_id,
@@ -510,8 +1143,8 @@ async def batch_extract_fields(document_id: str, fields: List[Dict[str, str]]) -
             }
         
         # Check if document is indexed
-        status = document_statuses.get(document_id, {}).get("status")
-        if status != DocumentStatus.INDEXED and status != DocumentStatus.COMPLETED:
+        status = (await asyncio.to_thread(get_document_status, document_id) or {}).get("status")
+        if status not in EXTRACTABLE_STATUSES:
             return {
                 "success": False,
                 "document_id": document_id,
@@ -519,20 +1152,16 @@ async def batch_extract_fields(document_id: str, fields: List[Dict[str, str]]) -
                 "status": "failed"
             }
         
-        # Update document status
-        update_document_status(document_id, DocumentStatus.EXTRACTING)
+        # Update document status, unless indexing is still running and will
+        # set it when done
+        if status != DocumentStatus.PARTIAL_INDEXED:
+            await asyncio.to_thread(update_document_status, document_id, DocumentStatus.EXTRACTING)
         
-        # Start extraction tasks for each field asynchronously
-        tasks = []
-        for field in fields:
-            field_name = field["name"]
-            field_description = field.get("description")
-            
-            # Create task for field extraction
-            task = asyncio.create_task(
-                extract_field(document_id, field_name, field_description)
-            )
-            tasks.append(task)
+        # Start one extraction task covering all fields, keeping a reference
+        # so it is not garbage collected before it finishes
+        task = asyncio.create_task(extract_fields(document_id, fields))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
         
         # Return immediately, don't wait for tasks to complete
         return {
@@ -576,26 +1205,20 @@ def delete_document(document_id: str) -> Dict[str, Any]:
         # Delete document from vector store
         collection_name = f"doc_{document_id}"
         try:
-            vector_store = get_vector_store(collection_name)
-            vector_store.delete_collection()
+            get_vector_store(collection_name).delete_collection()
         except Exception as e:
             logger.error(f"Error deleting vector store collection: {str(e)}")
+        with _cache_lock:
+            _vector_store_cache.pop(collection_name, None)
+        _flat_indexes.pop(document_id, None)
+        _clear_search_cache(document_id)
         
-        # Delete document files
-        file_path = document_metadata[document_id].get("file_path")
-        if file_path and os.path.exists(file_path):
-            os.unlink(file_path)
-        
-        # Delete document directory
-        document_dir = os.path.join(VECTOR_STORE_DIR, document_id)
-        if os.path.exists(document_dir):
-            import shutil
-            shutil.rmtree(document_dir)
+        # Delete the document directory, which holds the uploaded file
+        shutil.rmtree(os.path.join(VECTOR_STORE_DIR, document_id), ignore_errors=True)
         
         # Remove from metadata and status tracking
-        del document_metadata[document_id]
-        if document_id in document_statuses:
-            del document_statuses[document_id]
+        document_metadata.delete(document_id)
+        document_statuses.delete(document_id)
         
         return {
             "success": True,
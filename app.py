@@ -5,9 +5,25 @@ This application provides a simple web interface for document extraction using C
 
 import os
 import logging
+import hashlib
 import threading
 import time
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from flask import Flask, Response, render_template, request, jsonify
+from flask.json.provider import JSONProvider
+from werkzeug.utils import secure_filename as _secure_filename
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+try:
+    from whitenoise import WhiteNoise
+except ImportError:
+    WhiteNoise = None
 import uuid
 
 # Import ChromaDB vector store utilities
@@ -15,8 +31,12 @@ from utils.vector_store import (
     add_document_to_vector_store,
     extract_data_from_vector_store,
     get_document_status,
-    list_documents_in_vector_store
+    is_pdf_document,
+    list_documents_in_vector_store,
+    PDF_HEADER_SIZE
 )
+from utils.uploads import save_stream
+from utils.state_store import StateStore
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -28,21 +48,130 @@ app = Flask(__name__,
             static_folder='static')
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
-# Storage for document and task data
-documents = {}
-tasks = {}
+# Largest accepted request body, in bytes. Werkzeug checks Content-Length
+# before reading and stops streamed bodies at the limit, answering 413.
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+
+
+# Same options as FastAPI's ORJSONResponse; NumPy scores and vectors
+# serialize without conversion
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider serializing with orjson, used by jsonify"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=ORJSON_OPTIONS),
+            mimetype=self.mimetype
+        )
+
+
+app.json = ORJSONProvider(app)
+
+# Compress larger responses when flask-compress is installed. Streamed
+# responses (the event stream) are left alone so events are not buffered.
+if Compress is not None:
+    app.config["COMPRESS_MIN_SIZE"] = 1024
+    app.config["COMPRESS_STREAMS"] = False
+    Compress(app)
+
+# Clients re-upload the same few filenames, so sanitized names are memoized
+secure_filename = lru_cache(maxsize=4096)(_secure_filename)
+
+# Serve /static from WhiteNoise when installed: files are indexed once at
+# startup and sent with cache headers before the request reaches Flask.
+# Otherwise Flask's built-in static route serves them.
+if WhiteNoise is not None:
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=app.static_folder, prefix='static/', max_age=3600)
+
+# Seconds between task state checks while streaming extraction events, and
+# the longest a stream stays open before ending with a 'timeout' event. Each
+# open stream holds a worker thread, so streams are kept short.
+EVENT_POLL_INTERVAL = 0.5
+EVENT_STREAM_TIMEOUT = float(os.environ.get("EVENT_STREAM_TIMEOUT", "60"))
+
+# Background indexing and extraction jobs run on a bounded pool. New jobs are
+# refused with 503 once this many are queued or running, so clients retry
+# instead of piling up threads.
+BACKGROUND_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", "4"))
+MAX_PENDING_JOBS = int(os.environ.get("MAX_PENDING_JOBS", "64"))
+EXECUTOR = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS)
+_pending_jobs = 0
+_pending_jobs_lock = threading.Lock()
+
+# Document and task data, shared by all server workers
+documents = StateStore("flask_documents")
+tasks = StateStore("flask_tasks")
+
+def _jobs_full():
+    """
+    Whether the background pool has no room for another job
+    
+    An early, unlocked check so busy servers skip work such as saving an
+    upload; _submit_job makes the binding decision.
+    """
+    return _pending_jobs >= MAX_PENDING_JOBS
+
+def _job_done(_future):
+    global _pending_jobs
+    with _pending_jobs_lock:
+        _pending_jobs -= 1
+
+def _submit_job(func, *args):
+    """
+    Run func in the background pool, counting it as pending until done
+    
+    Returns:
+        False, without running func, when MAX_PENDING_JOBS jobs are pending
+    """
+    global _pending_jobs
+    with _pending_jobs_lock:
+        if _pending_jobs >= MAX_PENDING_JOBS:
+            return False
+        _pending_jobs += 1
+    EXECUTOR.submit(func, *args).add_done_callback(_job_done)
+    return True
+
+def _busy_response():
+    """503 response for when the background pool is full"""
+    return jsonify({
+        "success": False,
+        "error": "Server is busy, please retry shortly"
+    }), 503, {"Retry-After": "5"}
+
+@app.errorhandler(413)
+def request_too_large(_error):
+    """Report oversized uploads as JSON like the other API errors"""
+    return jsonify({"success": False, "error": "File too large"}), 413
 
 # Set up routes
+@lru_cache(maxsize=1)
+def _render_index():
+    """Render the main page once, returning (html, etag)"""
+    html = render_template('index.html')
+    return html, hashlib.md5(html.encode('utf-8')).hexdigest()
+
 @app.route('/')
 def index():
     """Render the main application page"""
-    return render_template('index.html')
+    # The page is static, so serve the cached render and answer
+    # If-None-Match revalidations with 304
+    html, etag = _render_index()
+    response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
 
-@app.route('/static/<path:path>')
-def serve_static(path):
-    """Serve static files"""
-    return send_from_directory('static', path)
-    
 @app.route('/api/test-openai-connection')
 def test_openai_connection():
     """Test OpenAI connection to validate Azure prioritization with fallback"""
@@ -70,36 +199,43 @@ def process_document_in_background(document_id, file_path, file_name):
     """Process document in background thread"""
     try:
         # Update document status
-        documents[document_id]["status"] = "indexing"
-        documents[document_id]["message"] = "Document is being indexed..."
+        documents.update(document_id, status="indexing", message="Document is being indexed...")
         
-        # Read the file
+        # Read the header for file type detection. The upload is already on
+        # disk, so PDFs are parsed in place and only text files are read whole.
         with open(file_path, "rb") as f:
-            file_content = f.read()
+            file_content = f.read(PDF_HEADER_SIZE)
+            if not is_pdf_document(file_content, file_name):
+                file_content += f.read()
         
         # Add document to vector store (pass filename for file type detection)
-        result = add_document_to_vector_store(document_id, file_content, file_name)
+        result = add_document_to_vector_store(document_id, file_content, file_name, file_path=file_path)
         
         if result.get("success", False):
             # Update document status to success
-            documents[document_id]["status"] = "indexed"
-            documents[document_id]["message"] = "Document indexed"
-            documents[document_id]["chunks"] = result.get("chunks", 0)
-            documents[document_id]["pages"] = result.get("pages", 0)
-            documents[document_id]["processing_time"] = result.get("processing_time", 0)
+            documents.update(
+                document_id,
+                status="indexed",
+                message="Document indexed",
+                chunks=result.get("chunks", 0),
+                pages=result.get("pages", 0),
+                processing_time=result.get("processing_time", 0)
+            )
             
             logger.info(f"Document {document_id} indexed successfully with {result.get('chunks', 0)} chunks")
         else:
             # Update document status to failed
-            documents[document_id]["status"] = "failed"
-            documents[document_id]["message"] = f"Indexing failed: {result.get('error', 'Unknown error')}"
+            documents.update(
+                document_id,
+                status="failed",
+                message=f"Indexing failed: {result.get('error', 'Unknown error')}"
+            )
             
             logger.error(f"Document {document_id} indexing failed: {result.get('error', 'Unknown error')}")
     
     except Exception as e:
         # Update document status to failed
-        documents[document_id]["status"] = "failed"
-        documents[document_id]["message"] = f"Indexing failed: {str(e)}"
+        documents.update(document_id, status="failed", message=f"Indexing failed: {str(e)}")
         
         logger.error(f"Error processing document {document_id}: {str(e)}")
 
@@ -110,27 +246,35 @@ def upload_document():
     if not file:
         return jsonify({"success": False, "error": "No file provided"}), 400
     
-    # Save file to uploads directory
-    os.makedirs('uploads', exist_ok=True)
-    file_path = os.path.join('uploads', file.filename)
-    file.save(file_path)
+    if _jobs_full():
+        return _busy_response()
     
     # Generate document ID
     document_id = str(uuid.uuid4())
     
+    # Save file to uploads directory
+    os.makedirs('uploads', exist_ok=True)
+    # Sanitize the client's filename before using it in a path, and prefix
+    # the document ID so concurrent uploads of the same name do not collide
+    file_path = os.path.join('uploads', f"{document_id}_{secure_filename(file.filename) or 'upload'}")
+    # Stream the upload to disk in 1 MB chunks, hashing it on the way
+    sha256 = save_stream(file.stream, file_path)
+    
     # Store document info
     documents[document_id] = {
         "file_name": file.filename,
         "file_path": file_path,
+        "sha256": sha256,
         "status": "pending",
         "message": "Document uploaded successfully. Indexing in progress..."
     }
     
-    # Start background processing
-    threading.Thread(
-        target=process_document_in_background, 
-        args=(document_id, file_path, file.filename)
-    ).start()
+    # Start background processing, discarding the upload if the pool filled
+    # up since the check above
+    if not _submit_job(process_document_in_background, document_id, file_path, file.filename):
+        del documents[document_id]
+        os.remove(file_path)
+        return _busy_response()
     
     # Return response
     return jsonify({
@@ -143,14 +287,15 @@ def upload_document():
 @app.route('/documents/<document_id>/status', methods=['GET'])
 def document_status(document_id):
     """Check document indexing status"""
-    if document_id in documents:
+    document = documents.get(document_id)
+    if document is not None:
         return jsonify({
             "success": True,
             "document_id": document_id,
             "status": {
-                "status": documents[document_id]["status"],
-                "message": documents[document_id].get("message", f"Document {documents[document_id]['status']}"),
-                "file_name": documents[document_id]["file_name"]
+                "status": document["status"],
+                "message": document.get("message", f"Document {document['status']}"),
+                "file_name": document["file_name"]
             }
         })
     else:
@@ -173,24 +318,31 @@ def document_status(document_id):
                 "error": f"Document {document_id} not found"
             }), 404
 
+def _fail_task(task_id, error):
+    """Mark a task and all of its fields as failed"""
+    task = tasks.get(task_id)
+    if task is None:
+        return
+    for field in task["fields"]:
+        field["status"] = "failed"
+        field["error"] = error
+    tasks.update(task_id, status="failed", fields=task["fields"])
+
 def process_extraction_in_background(task_id, document_id, fields):
     """Process extraction in background thread"""
     try:
         # Update task status
-        tasks[task_id]["status"] = "processing"
+        task = tasks.update(task_id, status="processing")
         
         # Extract data from vector store
         result = extract_data_from_vector_store(document_id, fields)
         
         if result.get("success", False):
-            # Update task status
-            tasks[task_id]["status"] = "completed"
-            
             # Update fields status
             extracted_data = result.get("data", {})
             field_progress = result.get("field_progress", {})
             
-            for field in tasks[task_id]["fields"]:
+            for field in task["fields"]:
                 field_name = field["field_name"]
                 
                 # Update field status based on extraction result
@@ -202,27 +354,20 @@ def process_extraction_in_background(task_id, document_id, fields):
                 # Update field result
                 if field_name in extracted_data:
                     field["result"] = extracted_data[field_name]
-                
+            
+            # Update task status and fields together
+            tasks.update(task_id, status="completed", fields=task["fields"])
+            
             logger.info(f"Extraction for task {task_id} completed successfully")
         else:
-            # Update task status to failed
-            tasks[task_id]["status"] = "failed"
-            
-            # Update all fields to failed
-            for field in tasks[task_id]["fields"]:
-                field["status"] = "failed"
-                field["error"] = result.get("error", "Unknown error")
+            # Update task status and all fields to failed
+            _fail_task(task_id, result.get("error", "Unknown error"))
             
             logger.error(f"Extraction for task {task_id} failed: {result.get('error', 'Unknown error')}")
     
     except Exception as e:
-        # Update task status to failed
-        tasks[task_id]["status"] = "failed"
-        
-        # Update all fields to failed
-        for field in tasks[task_id]["fields"]:
-            field["status"] = "failed"
-            field["error"] = str(e)
+        # Update task status and all fields to failed
+        _fail_task(task_id, str(e))
         
         logger.error(f"Error processing extraction for task {task_id}: {str(e)}")
 
@@ -233,6 +378,9 @@ def extract_data():
     document_id = data.get("document_id")
     fields = data.get("fields", [])
     
+    if _jobs_full():
+        return _busy_response()
+    
     # Check if document exists in our local registry
     document_exists = document_id in documents
     
@@ -266,10 +414,9 @@ def extract_data():
     }
     
     # Start background processing
-    threading.Thread(
-        target=process_extraction_in_background,
-        args=(task_id, document_id, fields)
-    ).start()
+    if not _submit_job(process_extraction_in_background, task_id, document_id, fields):
+        del tasks[task_id]
+        return _busy_response()
     
     # Return response
     return jsonify({
@@ -279,28 +426,31 @@ def extract_data():
         "message": "Extraction started"
     })
 
+def _task_completed(task):
+    """Whether a task has finished, or all of its fields have"""
+    return (
+        task["status"] == "completed" or 
+        task["status"] == "failed" or 
+        all(field["status"] in ["completed", "failed"] for field in task["fields"])
+    )
+
 @app.route('/extraction/<task_id>/status', methods=['GET'])
 def extraction_status(task_id):
     """Check extraction status"""
-    # Check if task exists
-    if task_id not in tasks:
+    # Get task info
+    task = tasks.get(task_id)
+    if task is None:
         return jsonify({
             "success": False,
             "error": f"Task {task_id} not found"
         }), 404
     
-    # Get task info
-    task = tasks[task_id]
-    
     # Check if all fields are completed
-    completed = (
-        task["status"] == "completed" or 
-        task["status"] == "failed" or 
-        all(field["status"] in ["completed", "failed"] for field in task["fields"])
-    )
+    completed = _task_completed(task)
     
     if completed and task["status"] == "processing":
         task["status"] = "completed"
+        tasks.update(task_id, status="completed")
     
     # Return response
     return jsonify({
@@ -312,18 +462,62 @@ def extraction_status(task_id):
         "completed": completed
     })
 
-@app.route('/extraction/<task_id>/result', methods=['GET'])
-def extraction_result(task_id):
-    """Get extraction results"""
-    # Check if task exists
+@app.route('/extraction/<task_id>/events', methods=['GET'])
+def extraction_events(task_id):
+    """
+    Stream extraction progress as server-sent events
+    
+    Each open stream holds a worker thread for up to EVENT_STREAM_TIMEOUT
+    seconds, so serve this route with an async worker class such as gevent
+    when clients use it; with gthread workers, poll the status route instead.
+    """
     if task_id not in tasks:
         return jsonify({
             "success": False,
             "error": f"Task {task_id} not found"
         }), 404
     
+    def generate():
+        sent = {}
+        deadline = time.monotonic() + EVENT_STREAM_TIMEOUT
+        while True:
+            task = tasks.get(task_id)
+            if task is None:
+                return
+            
+            # Only send fields whose state changed since the last check
+            for field in task["fields"]:
+                if sent.get(field["field_name"]) != field:
+                    sent[field["field_name"]] = field
+                    yield b"data: " + orjson.dumps(field) + b"\n\n"
+            
+            if _task_completed(task):
+                yield b"event: done\ndata: " + orjson.dumps({"status": task["status"]}) + b"\n\n"
+                return
+            
+            # Don't hold a worker thread forever on a task that never finishes
+            if time.monotonic() >= deadline:
+                yield b"event: timeout\ndata: " + orjson.dumps({"status": task["status"]}) + b"\n\n"
+                return
+            
+            time.sleep(EVENT_POLL_INTERVAL)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/extraction/<task_id>/result', methods=['GET'])
+def extraction_result(task_id):
+    """Get extraction results"""
     # Get task info
-    task = tasks[task_id]
+    task = tasks.get(task_id)
+    if task is None:
+        return jsonify({
+            "success": False,
+            "error": f"Task {task_id} not found"
+        }), 404
     
     # Format results
     results = {
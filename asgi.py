@@ -1,8 +1,13 @@
 """
 ASGI entry point for the FastAPI application
+
+Serve it natively with uvicorn workers rather than through the WSGI bridge in
+adapters.py, e.g.:
+
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:application
 """
 
-from app import app
+from fastapi_app import app
 
 # Make the application importable for ASGI servers
-application = app
\ No newline at end of file
+application = app
@@ -7,17 +7,20 @@ Azure OpenAI services but can fall back to standard OpenAI API if Azure is unava
 It now supports using ChromaDB for vector storage and retrieval for more efficient and targeted extraction.
 """
 
-import os
 import json
 import base64
+import hashlib
 import logging
 import tempfile
-from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import pypdf
 
 from langchain_core.messages import SystemMessage, HumanMessage
+from utils import extraction_cache
 from utils.azure_openai_config import get_chat_openai
+from utils.pdf_extractor import extract_pages
 from utils.document_chunking import (
     split_text_into_chunks,
     merge_extraction_results,
@@ -66,7 +69,9 @@ def extract_text_from_pdf(file_path: str) -> str:
         num_pages = len(reader.pages)
         logger.info(f"PDF document has {num_pages} pages")
         
-        text = ""
+        # The strategies below choose which pages to read, in order; the pages
+        # are then extracted together so large selections parse in parallel
+        page_numbers = []
         
         # Different extraction strategy based on document type
         if is_morgan_stanley:
@@ -77,27 +82,20 @@ def extract_text_from_pdf(file_path: str) -> str:
             
             # Extract from early pages (table of contents, highlights, key metrics)
             toc_range = min(15, num_pages)  # First few pages usually contain TOC
-            for i in range(toc_range):
-                page_text = reader.pages[i].extract_text() or ""
-                text += page_text + "\n\n"
+            page_numbers.extend(range(toc_range))
             
             # For Morgan Stanley, financial data is often in pages 60-120
             financial_start = min(60, num_pages)
             financial_end = min(120, num_pages)
-            
-            for i in range(financial_start, financial_end):
-                if i < num_pages:
-                    page_text = reader.pages[i].extract_text() or ""
-                    text += page_text + "\n\n"
+            page_numbers.extend(range(financial_start, financial_end))
                     
             # Also extract management discussion section (usually pages 25-50)
             mda_start = min(25, num_pages)
             mda_end = min(50, num_pages)
-            
-            for i in range(mda_start, mda_end):
-                if i < num_pages and i not in range(financial_start, financial_end):
-                    page_text = reader.pages[i].extract_text() or ""
-                    text += page_text + "\n\n"
+            page_numbers.extend(
+                i for i in range(mda_start, mda_end)
+                if i not in range(financial_start, financial_end)
+            )
                     
         elif is_capital_one:
             logger.info("Using Capital One specific extraction strategy")
@@ -107,18 +105,12 @@ def extract_text_from_pdf(file_path: str) -> str:
             
             # Extract early pages for executive summary
             early_pages = min(int(num_pages * 0.25), 25)
-            for i in range(early_pages):
-                page_text = reader.pages[i].extract_text() or ""
-                text += page_text + "\n\n"
+            page_numbers.extend(range(early_pages))
             
             # Capital One often has key financial tables from pages 40-80
             middle_start = max(30, early_pages)
             middle_end = min(num_pages, 80)
-            
-            for i in range(middle_start, middle_end):
-                if i < num_pages:
-                    page_text = reader.pages[i].extract_text() or ""
-                    text += page_text + "\n\n"
+            page_numbers.extend(range(middle_start, middle_end))
                 
         else:
             # Default extraction for general financial documents
@@ -128,29 +120,24 @@ def extract_text_from_pdf(file_path: str) -> str:
             # First extract from early pages (likely to contain management discussion, financial highlights)
             early_pages = min(int(max_pages * 0.3), 30)  # Up to 30% of document or 30 pages
             logger.info(f"Extracting first {early_pages} pages for executive summary and key metrics")
-            
-            for i in range(early_pages):
-                if i < num_pages:
-                    page_text = reader.pages[i].extract_text() or ""
-                    text += page_text + "\n\n"
+            page_numbers.extend(range(early_pages))
             
             # Then extract from middle pages (likely to contain financial statements and tables)
             if num_pages > early_pages:
                 middle_start = early_pages
                 middle_end = min(num_pages, 70)  # Financial statements usually before page 70
                 logger.info(f"Extracting middle pages {middle_start} to {middle_end} for financial statements")
-                
-                for i in range(middle_start, middle_end):
-                    if i < num_pages:
-                        page_text = reader.pages[i].extract_text() or ""
-                        text += page_text + "\n\n"
+                page_numbers.extend(range(middle_start, middle_end))
+        
+        # Page texts are joined once, rather than growing one string page by page
+        text = "\n\n".join(extract_pages(file_path, page_numbers, reader))
         
         # If text extraction failed or text is too short, try fallback method
         if len(text.strip()) < 1000 and num_pages > 5:
             logger.warning(f"Primary extraction yielded insufficient text ({len(text)} chars), using alternative method")
             
             # Fallback to sequential extraction of all pages
-            text = ""
+            pages = []
             
             # Try PyMuPDF as the fallback extraction method
             try:
@@ -158,7 +145,7 @@ def extract_text_from_pdf(file_path: str) -> str:
                 doc = fitz.open(file_path)
                 for i in range(min(num_pages, 100)):
                     page_text = doc[i].get_text() or ""
-                    text += page_text + "\n\n"
+                    pages.append(page_text)
                 doc.close()
                 logger.info("PyMuPDF fallback extraction successful")
             except Exception as mupdf_error:
@@ -166,7 +153,9 @@ def extract_text_from_pdf(file_path: str) -> str:
                 # Fall back to original pypdf
                 for i in range(min(num_pages, 100)):  # Limit to 100 pages
                     page_text = reader.pages[i].extract_text() or ""
-                    text += page_text + "\n\n"
+                    pages.append(page_text)
+            
+            text = "\n\n".join(pages)
         
         # Process the text to clean up common PDF extraction issues in financial documents
         processed_text = text.replace("$", "$ ")  # Add space after dollar signs for better recognition
@@ -419,6 +408,13 @@ def extract_document_data(file_path: str, schema: Optional[Dict[str, Any]] = Non
         return {"success": False, "error": str(e)}
 
 
+def _cache_result(cache_key: Optional[str], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a successful extraction result in the cache and return it"""
+    if cache_key and result.get("success") and isinstance(result.get("data"), dict):
+        extraction_cache.put(cache_key, result["data"])
+    return result
+
+
 def extract_from_binary_data(file_content: bytes, schema: Optional[Dict[str, Any]] = None,
                           use_chunking: bool = True, return_text: bool = False,
                           file_extension: str = ".pdf") -> Dict[str, Any]:
@@ -436,6 +432,15 @@ def extract_from_binary_data(file_content: bytes, schema: Optional[Dict[str, Any
         Dictionary with extraction results including either extracted data or error
     """
     try:
+        # Serve repeated extractions of the same document and schema from the cache
+        cache_key = None
+        if not return_text and extraction_cache.is_enabled():
+            cache_key = extraction_cache.make_key(hashlib.sha256(file_content).hexdigest(), schema)
+            cached = extraction_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Extraction cache hit for {cache_key}")
+                return {"success": True, "data": cached, "extraction_method": "cache"}
+        
         # Detect if this is a text file by checking the first few bytes
         is_text_file = False
         try:
@@ -469,11 +474,11 @@ def extract_from_binary_data(file_content: bytes, schema: Optional[Dict[str, Any
                 # Extract structured data directly from the text
                 try:
                     data = extract_structured_data(text, schema)
-                    return {
+                    return _cache_result(cache_key, {
                         "success": True,
                         "data": data,
                         "extraction_method": "text_direct"
-                    }
+                    })
                 except Exception as e:
                     logger.error(f"Error extracting structured data from text: {str(e)}")
                     return {"success": False, "error": str(e)}
@@ -487,11 +492,10 @@ def extract_from_binary_data(file_content: bytes, schema: Optional[Dict[str, Any
                 # Extract data from the temporary file, passing the chunking parameter
                 result = extract_document_data(tmp_path, schema, use_chunking=use_chunking)
             
-            return result
+            return _cache_result(cache_key, result)
         finally:
             # Clean up the temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            Path(tmp_path).unlink(missing_ok=True)
     
     except Exception as e:
         logger.error(f"Error processing binary data: {str(e)}")
@@ -538,13 +542,56 @@ def convert_pdf_page_to_base64(file_path: str, page_num: int = 0) -> str:
         raise
 
 
+def iter_tables_from_pdf(file_path: str, page_limit: int) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the tables of the first page_limit pages of a PDF as they are found
+    
+    Tables are detected from the page layout with PyMuPDF. Pages are
+    processed one at a time, so callers can stream each table without
+    waiting for the whole document. Pages that fail are logged and skipped.
+    
+    Args:
+        file_path: Path to the PDF document
+        page_limit: Number of pages to process
+        
+    Yields:
+        One table dictionary per table found, with its 1-based page number,
+        a title, the column headers and the data rows
+    """
+    import fitz  # PyMuPDF
+    
+    doc = fitz.open(file_path)
+    try:
+        for page_num in range(min(page_limit, len(doc))):
+            try:
+                logger.info(f"Processing page {page_num + 1} of {page_limit}")
+                tables = doc.load_page(page_num).find_tables().tables
+            except Exception as e:
+                logger.warning(f"Error processing page {page_num + 1}: {str(e)}")
+                continue
+            
+            logger.info(f"Found {len(tables)} tables on page {page_num + 1}")
+            for table_num, table in enumerate(tables, start=1):
+                rows = table.extract()
+                # A header inside the table is also its first extracted row
+                if not table.header.external:
+                    rows = rows[1:]
+                yield {
+                    "page": page_num + 1,
+                    "table_title": f"Page {page_num + 1}, table {table_num}",
+                    "headers": list(table.header.names),
+                    "data": rows
+                }
+    finally:
+        doc.close()
+
+
 def extract_tables_from_pdf(file_path: str, max_pages: int = 5) -> Dict[str, Any]:
     """
-    Extract tables from a PDF document using OpenAI services
+    Extract tables from a PDF document
     
-    This function is intended to use OpenAI's vision capabilities when available.
-    Currently, since neither Azure OpenAI nor standard OpenAI through LangChain fully support 
-    multimodal content this way, it will return an error message.
+    Tables are detected from the page layout with PyMuPDF, without calling
+    a model.
     
     Args:
         file_path: Path to the PDF document
@@ -561,70 +608,13 @@ def extract_tables_from_pdf(file_path: str, max_pages: int = 5) -> Dict[str, Any
         if total_pages == 0:
             return {"success": False, "error": "PDF document is empty"}
         
-        # List to store all tables
-        all_tables = []
-        
         # Process each page (limit to max_pages for performance)
         page_limit = min(total_pages, max_pages)
         
         # Process pages with progress logging
         logger.info(f"Starting table extraction from {page_limit} pages out of {total_pages} total pages")
         
-        for page_num in range(page_limit):
-            try:
-                logger.info(f"Processing page {page_num + 1} of {page_limit}")
-                
-                # Convert the page to base64
-                base64_image = convert_pdf_page_to_base64(file_path, page_num)
-                
-                # Prepare system message for table extraction
-                system_prompt = (
-                    "You are a table extraction expert. Identify and extract any tables in this PDF page. "
-                    "If multiple tables are present, extract each one separately and provide a brief title or description for each table. "
-                    "Format the output as a JSON array of table objects with this structure: "
-                    "[{\"table_title\": \"Title of the table\", \"headers\": [\"Column1\", \"Column2\", ...], \"data\": [[\"row1col1\", \"row1col2\", ...], [\"row2col1\", \"row2col2\", ...], ...]}, ...]. "
-                    "If no tables are present in the image, return an empty array []. "
-                    "Make sure to maintain the row and column structure of each table. "
-                    "Only extract actual tables with proper headers and rows. Do not extract lists, paragraphs of text, or other non-tabular content."
-                )
-                
-                # Create LangChain message objects for table extraction
-                system_message = SystemMessage(content=system_prompt)
-                
-                # Note: This is a placeholder for future Azure OpenAI with vision capabilities
-                # Currently using a temporary implementation until Azure OpenAI fully supports multimodal content
-                try:
-                    # Get OpenAI client for table extraction with fallback
-                    client = get_chat_openai(temperature=0.1, max_tokens=500)
-                    
-                    # Placeholder for OpenAI vision implementation
-                    # This is intentionally designed to raise an exception for now
-                    logger.info("Attempting to extract tables using OpenAI services...")
-                    
-                    # This will raise an exception since LangChain doesn't yet fully support multimodal content this way
-                    # The error will be caught and propagated
-                    raise NotImplementedError("OpenAI multimodal extraction not yet implemented in this application")
-                    
-                except Exception as e:
-                    error_msg = f"OpenAI connection failed (tried both Azure and standard OpenAI if configured): {e}"
-                    logger.error(error_msg)
-                    
-                    # Return an empty array for tables, but with a clear error message
-                    raise Exception(error_msg)
-                
-                # Note: Since we're raising an exception in the try/except block above,
-                # this code will never be reached in the current implementation.
-                # It's kept as a template for future implementation when Azure OpenAI
-                # supports multimodal vision capabilities.
-                
-                # If we ever get to this point, it means we've successfully processed
-                # a table with Azure OpenAI. Add a placeholder to process the response.
-                tables_found = 0
-                logger.info(f"Successfully processed page {page_num + 1}, found {tables_found} tables")
-                
-            except Exception as e:
-                logger.warning(f"Error processing page {page_num + 1}: {str(e)}")
-                continue
+        all_tables = list(iter_tables_from_pdf(file_path, page_limit))
         
         logger.info(f"Table extraction complete. Found {len(all_tables)} tables across {page_limit} pages.")
         
@@ -643,11 +633,10 @@ def extract_tables_from_pdf(file_path: str, max_pages: int = 5) -> Dict[str, Any
 
 def extract_tables_from_binary_data(file_content: bytes, max_pages: int = 5) -> Dict[str, Any]:
     """
-    Extract tables from binary document content using OpenAI services
+    Extract tables from binary document content
     
-    This function is intended to use OpenAI's vision capabilities when available.
-    Currently, since neither Azure OpenAI nor standard OpenAI through LangChain fully support 
-    multimodal content this way, it will return an error message.
+    The content is written to a temporary file and passed to
+    extract_tables_from_pdf.
     
     Args:
         file_content: Binary content of the document
@@ -669,8 +658,7 @@ def extract_tables_from_binary_data(file_content: bytes, max_pages: int = 5) ->
             return result
         finally:
             # Clean up the temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            Path(tmp_path).unlink(missing_ok=True)
     
     except Exception as e:
         logger.error(f"Error processing binary data for table extraction: {str(e)}")
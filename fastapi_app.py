@@ -0,0 +1,1296 @@
+"""
+Document Extraction API
+
+This module provides a FastAPI application with endpoints for document upload, 
+indexing, and extraction using a retrieval-augmented generation (RAG) approach.
+
+Main APIs:
+- Upload/Index API: Handles document upload and vectorization
+- Extract API: Extracts specific fields using RAG
+"""
+
+import os
+import time
+import orjson
+import asyncio
+import logging
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
+from pathlib import Path
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import asynccontextmanager
+
+import httpx
+import openai
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Form, Body
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+# LangChain imports
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI, AzureOpenAIEmbeddings, AzureChatOpenAI, OpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.document_loaders import PyMuPDFLoader, TextLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from utils.process_pool import get_process_pool, shutdown_process_pool
+from utils.state_store import StateStore
+from utils.uploads import save_stream
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, 
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Create uploads directory if it doesn't exist
+UPLOAD_DIR = Path("uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Largest accepted request body (uploads included), in bytes
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+
+# Configure vector database directory
+VECTOR_DB_DIR = Path("vector_db")
+VECTOR_DB_DIR.mkdir(exist_ok=True)
+
+# HTTP clients shared by all OpenAI calls so connections (and TLS sessions)
+# are reused across requests. HTTP/2 is used when the h2 package is present.
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+SHARED_HTTP_CLIENT = httpx.Client(timeout=60, limits=HTTP_LIMITS, http2=HTTP2_ENABLED)
+SHARED_ASYNC_HTTP_CLIENT = httpx.AsyncClient(timeout=60, limits=HTTP_LIMITS, http2=HTTP2_ENABLED)
+
+# Number of recently indexed documents whose FAISS indexes are loaded at
+# startup, and the most indexes a worker keeps loaded
+PRELOAD_INDEX_LIMIT = int(os.environ.get("PRELOAD_INDEX_LIMIT", "32"))
+
+# Loaded FAISS indexes as (indexed_at, store), keyed by collection name, in
+# least recently used order. indexed_at comes from the shared document state,
+# so a worker reloads an index that another worker has rebuilt.
+_vector_stores: "OrderedDict[str, Tuple[Optional[float], FAISS]]" = OrderedDict()
+_vector_stores_lock = threading.Lock()
+
+# LRU cache of retrieved chunks keyed by (document ID, indexed_at, query
+# hash, k), so repeated extractions of the same fields skip the embedding and
+# search round-trip. Keying on the shared indexed_at makes entries miss after
+# a re-index by any worker; this worker's entries are also dropped at once.
+RETRIEVAL_CACHE_SIZE = 256
+_retrieval_cache: "OrderedDict[Tuple[str, Optional[float], str, int], list]" = OrderedDict()
+
+# Document and task state, shared by all worker processes. Store calls are
+# blocking SQLite transactions that can wait on other workers' writes, so
+# async code runs them in worker threads via asyncio.to_thread.
+document_store = StateStore("documents")
+extraction_tasks = StateStore("extraction_tasks")
+extraction_results = StateStore("extraction_results")
+
+# Configure OpenAI API key
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+AZURE_OPENAI_API_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_DEPLOYMENT_NAME = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME")
+# the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+# do not change this unless explicitly requested by the user
+OPENAI_MODEL = "gpt-4o"
+
+# Force the chat model to emit a single valid JSON object
+JSON_RESPONSE_FORMAT = {"response_format": {"type": "json_object"}}
+
+# Fields sent to the LLM per extraction call, and the cap on concurrent LLM
+# calls across all extraction tasks to stay under provider rate limits
+FIELD_BATCH_SIZE = int(os.environ.get("FIELD_BATCH_SIZE", "10"))
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+# Seconds between task state checks while streaming extraction events, and
+# the longest a stream stays open before ending with a 'timeout' event
+EVENT_POLL_INTERVAL = 0.5
+EVENT_STREAM_TIMEOUT = float(os.environ.get("EVENT_STREAM_TIMEOUT", "600"))
+
+# Number of texts sent per embeddings API request
+EMBEDDING_BATCH_SIZE = 512
+
+# Embedding vector size. text-embedding-3 models can return shortened
+# vectors, which makes FAISS indexes and searches ~3x smaller than at 1536.
+# Azure deployments only support this for text-embedding-3 models, so it is
+# opt-in there. Each index records its size; documents indexed with another
+# size are re-indexed when an extraction is requested.
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "512"))
+AZURE_OPENAI_EMBEDDINGS_DIMENSIONS = os.environ.get("AZURE_OPENAI_EMBEDDINGS_DIMENSIONS")
+
+# Define models
+class DocumentUploadResponse(BaseModel):
+    success: bool = Field(..., description="Whether the upload was successful")
+    document_id: Optional[str] = Field(None, description="ID of the uploaded document")
+    error: Optional[str] = Field(None, description="Error message if upload failed")
+    indexing_status: Optional[str] = Field(None, description="Status of the indexing process")
+
+class BatchUploadResponse(BaseModel):
+    success: bool = Field(..., description="Whether at least one file was uploaded")
+    documents: List[DocumentUploadResponse] = Field(..., description="Upload result for each file, in request order")
+
+class ExtractionField(BaseModel):
+    name: str = Field(..., description="Name of the field to extract")
+    description: str = Field(..., description="Description of the field to help with extraction")
+
+class ExtractionRequest(BaseModel):
+    document_id: str = Field(..., description="ID of the document to extract data from")
+    fields: List[ExtractionField] = Field(..., description="Fields to extract from the document")
+
+class ExtractionResponse(BaseModel):
+    success: bool = Field(..., description="Whether the extraction was successful")
+    document_id: str = Field(..., description="ID of the document")
+    task_id: str = Field(..., description="ID of the extraction task")
+    message: str = Field(..., description="Status message")
+
+class FieldExtractionStatus(BaseModel):
+    field_name: str = Field(..., description="Name of the field")
+    status: str = Field(..., description="Status of the extraction (pending, processing, completed, failed)")
+    result: Optional[Any] = Field(None, description="Extracted value if status is completed")
+    error: Optional[str] = Field(None, description="Error message if status is failed")
+
+class ExtractionStatusResponse(BaseModel):
+    success: bool = Field(..., description="Whether the status check was successful")
+    document_id: str = Field(..., description="ID of the document")
+    task_id: str = Field(..., description="ID of the extraction task")
+    status: str = Field(..., description="Overall status of the extraction task")
+    fields: List[FieldExtractionStatus] = Field(..., description="Status of each field extraction")
+    completed: bool = Field(..., description="Whether all field extractions are complete")
+
+class MaxBodySizeMiddleware:
+    """
+    Reject request bodies larger than max_size with 413
+
+    A declared Content-Length is checked before any of the body is read.
+    Bodies without one (chunked uploads) are counted as they arrive and
+    cut off once they pass the limit.
+    """
+    
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            response = ORJSONResponse(status_code=413, content={"detail": "File too large"})
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the model clients at startup and release shared resources at shutdown"""
+    # Build (and test) the cached clients before the first request needs them
+    for warm_up in (get_embeddings, get_llm, preload_vector_stores):
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            logger.warning(f"Could not pre-warm {warm_up.__name__}: {str(e)}")
+    
+    yield
+    
+    await SHARED_ASYNC_HTTP_CLIENT.aclose()
+    SHARED_HTTP_CLIENT.close()
+    shutdown_process_pool()
+
+# Create FastAPI app
+app = FastAPI(title="Document Extraction API",
+              description="API for document upload, indexing, and extraction using RAG",
+              default_response_class=ORJSONResponse,
+              lifespan=lifespan)
+
+# Refuse oversized uploads before they are buffered. Added before CORS so
+# the 413 responses still carry CORS headers.
+app.add_middleware(MaxBodySizeMiddleware, max_size=MAX_UPLOAD_SIZE)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Compress larger JSON responses such as task status and results. Event
+# streams are left uncompressed by the middleware.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Utility functions
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """Get embeddings model with proper fallback"""
+    try:
+        # First try Azure OpenAI embeddings
+        if AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
+            try:
+                # Get deployment name specifically for embeddings or fallback to general deployment name
+                embeddings_deployment = os.environ.get("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT") or os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "text-embedding-ada-002")
+                
+                logger.info(f"Initializing Azure OpenAI embeddings with deployment: {embeddings_deployment}")
+                
+                azure_embeddings = AzureOpenAIEmbeddings(
+                    azure_deployment=embeddings_deployment,
+                    openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2023-05-15"),
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    api_key=AZURE_OPENAI_API_KEY,
+                    chunk_size=EMBEDDING_BATCH_SIZE,
+                    dimensions=int(AZURE_OPENAI_EMBEDDINGS_DIMENSIONS) if AZURE_OPENAI_EMBEDDINGS_DIMENSIONS else None,
+                    http_client=SHARED_HTTP_CLIENT,
+                    http_async_client=SHARED_ASYNC_HTTP_CLIENT,
+                )
+                
+                # Test the embeddings
+                logger.info("Testing Azure OpenAI embeddings connection")
+                _ = azure_embeddings.embed_query("test")
+                logger.info("Successfully initialized Azure OpenAI embeddings")
+                return azure_embeddings
+            except Exception as e:
+                logger.error(f"Error initializing Azure OpenAI embeddings, will fall back to standard OpenAI: {str(e)}")
+        else:
+            logger.warning("Azure OpenAI credentials not fully configured, will try standard OpenAI")
+        
+        # Fallback to standard OpenAI embeddings
+        if OPENAI_API_KEY:
+            logger.info("Falling back to standard OpenAI embeddings")
+            model = "text-embedding-3-small"  # Latest embeddings model
+            standard_embeddings = OpenAIEmbeddings(
+                model=model,
+                api_key=OPENAI_API_KEY,
+                chunk_size=EMBEDDING_BATCH_SIZE,
+                dimensions=EMBEDDING_DIMENSIONS,
+                http_client=SHARED_HTTP_CLIENT,
+                http_async_client=SHARED_ASYNC_HTTP_CLIENT
+            )
+            # Test the embeddings
+            logger.info("Testing standard OpenAI embeddings connection")
+            _ = standard_embeddings.embed_query("test")
+            logger.info("Successfully initialized standard OpenAI embeddings")
+            return standard_embeddings
+        else:
+            logger.error("No OPENAI_API_KEY set for fallback")
+            
+        # If we get here, we couldn't initialize any embeddings service
+        raise Exception("Failed to initialize either Azure OpenAI or standard OpenAI embeddings")
+    except Exception as e:
+        logger.error(f"Error initializing embeddings: {str(e)}")
+        raise
+
+@lru_cache(maxsize=1)
+def get_embedding_dimensions() -> int:
+    """Vector size returned by the configured embeddings model"""
+    return len(get_embeddings().embed_query("dimensions"))
+
+def get_index_dimensions(document) -> int:
+    """Vector size of a document's FAISS index"""
+    dimensions = document.get("embedding_dimensions")
+    if dimensions is None:
+        # Indexed before the size was recorded; read it from the index
+        dimensions = get_vector_store(f"doc_{document['id']}", document.get("indexed_at")).index.d
+    return dimensions
+
+def _cache_vector_store(collection_name: str, indexed_at: Optional[float], vector_store):
+    """Keep a loaded index, evicting the least recently used beyond PRELOAD_INDEX_LIMIT"""
+    with _vector_stores_lock:
+        _vector_stores[collection_name] = (indexed_at, vector_store)
+        _vector_stores.move_to_end(collection_name)
+        while len(_vector_stores) > PRELOAD_INDEX_LIMIT:
+            _vector_stores.popitem(last=False)
+
+def get_vector_store(collection_name, indexed_at: Optional[float] = None):
+    """
+    Get vector store for a specific collection
+    
+    Args:
+        collection_name: Name of the document's collection
+        indexed_at: The document's indexed_at from the shared state; a loaded
+            copy built for another value is stale and is reloaded from disk
+    """
+    with _vector_stores_lock:
+        cached = _vector_stores.get(collection_name)
+        if cached is not None and cached[0] == indexed_at:
+            _vector_stores.move_to_end(collection_name)
+            return cached[1]
+    
+    try:
+        embeddings = get_embeddings()
+        
+        # Path for this specific collection's FAISS index
+        index_path = os.path.join(str(VECTOR_DB_DIR), collection_name)
+        os.makedirs(index_path, exist_ok=True)
+        
+        # Check if a FAISS index already exists for this collection
+        index_file = os.path.join(index_path, "index.faiss")
+        if os.path.exists(index_file):
+            logger.info(f"Loading existing FAISS index for {collection_name}")
+            vector_store = FAISS.load_local(
+                index_path, 
+                embeddings, 
+                allow_dangerous_deserialization=True  # This is safe as we control the creation of these files
+            )
+        else:
+            logger.info(f"Creating new FAISS index for {collection_name}")
+            # Create a new empty FAISS index
+            vector_store = FAISS.from_texts(["placeholder"], embeddings, metadatas=[{"source": "placeholder"}])
+            # Save the empty index
+            vector_store.save_local(index_path)
+        
+        _cache_vector_store(collection_name, indexed_at, vector_store)
+        return vector_store
+    except Exception as e:
+        logger.error(f"Error getting vector store: {str(e)}")
+        raise
+
+def preload_vector_stores():
+    """Load the FAISS indexes of the most recently indexed documents into memory"""
+    indexed = sorted(
+        (doc for _, doc in document_store.items() if doc.get("status") == "indexed"),
+        key=lambda doc: doc.get("indexed_at") or 0,
+        reverse=True
+    )
+    expected = get_embedding_dimensions()
+    loaded = 0
+    for doc in indexed[:PRELOAD_INDEX_LIMIT]:
+        collection_name = f"doc_{doc['id']}"
+        # Indexes built with another embedding size cannot be searched; they
+        # are re-indexed when an extraction is requested
+        dimensions = get_index_dimensions(doc)
+        if dimensions != expected:
+            with _vector_stores_lock:
+                _vector_stores.pop(collection_name, None)
+            logger.warning(
+                f"Skipping FAISS index of document {doc['id']}: built with {dimensions}-dimensional "
+                f"embeddings, but the embeddings model returns {expected}"
+            )
+            continue
+        get_vector_store(collection_name, doc.get("indexed_at"))
+        loaded += 1
+    logger.info(f"Preloaded {loaded} FAISS indexes")
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """Get language model with proper fallback"""
+    try:
+        # Try Azure OpenAI first
+        if AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_DEPLOYMENT_NAME:
+            try:
+                logger.info(f"Initializing Azure OpenAI LLM with deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
+                
+                # JSON mode needs API version 2023-12-01-preview or later
+                azure_client = AzureChatOpenAI(
+                    azure_deployment=AZURE_OPENAI_DEPLOYMENT_NAME,
+                    openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-01"),
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    api_key=AZURE_OPENAI_API_KEY,
+                    temperature=0,
+                    model_kwargs=JSON_RESPONSE_FORMAT,
+                    http_client=SHARED_HTTP_CLIENT,
+                    http_async_client=SHARED_ASYNC_HTTP_CLIENT,
+                )
+                
+                # Test the Azure OpenAI client (JSON mode requires the prompt to mention JSON)
+                logger.info("Testing Azure OpenAI LLM connection")
+                test_message = SystemMessage(content="You are a helpful assistant. Respond in JSON.")
+                test_result = azure_client.invoke([test_message, HumanMessage(content="Hello")])
+                if test_result:
+                    logger.info("Successfully tested Azure OpenAI LLM")
+                    return azure_client
+            except Exception as e:
+                logger.error(f"Failed to configure or test Azure OpenAI LLM: {str(e)}")
+                logger.info("Will try standard OpenAI as fallback")
+        else:
+            logger.warning("Azure OpenAI credentials not fully configured")
+            missing = []
+            if not AZURE_OPENAI_API_KEY:
+                missing.append("AZURE_OPENAI_API_KEY")
+            if not AZURE_OPENAI_ENDPOINT:
+                missing.append("AZURE_OPENAI_ENDPOINT")
+            if not AZURE_OPENAI_DEPLOYMENT_NAME:
+                missing.append("AZURE_OPENAI_DEPLOYMENT_NAME")
+            logger.info(f"Missing Azure OpenAI credentials: {', '.join(missing)}")
+            logger.info("Will try standard OpenAI as fallback")
+        
+        # Fall back to standard OpenAI
+        if OPENAI_API_KEY:
+            try:
+                # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+                # do not change this unless explicitly requested by the user
+                logger.info(f"Falling back to standard OpenAI with model: {OPENAI_MODEL}")
+                openai_client = ChatOpenAI(
+                    model=OPENAI_MODEL,
+                    api_key=OPENAI_API_KEY,
+                    temperature=0,
+                    model_kwargs=JSON_RESPONSE_FORMAT,
+                    http_client=SHARED_HTTP_CLIENT,
+                    http_async_client=SHARED_ASYNC_HTTP_CLIENT,
+                )
+                logger.info("Successfully created standard OpenAI client")
+                return openai_client
+            except Exception as e:
+                logger.error(f"Failed to configure standard OpenAI LLM: {str(e)}")
+        else:
+            logger.error("No OPENAI_API_KEY set for fallback")
+        
+        # If we get here, we couldn't initialize any LLM
+        raise Exception("Failed to configure either Azure OpenAI or standard OpenAI LLM")
+    except Exception as e:
+        logger.error(f"Error initializing language model: {str(e)}")
+        raise
+
+def is_pdf_file(file_path: str) -> bool:
+    """Check for the PDF magic number rather than trusting the file extension"""
+    with open(file_path, "rb") as f:
+        return f.read(8).startswith(b"%PDF-")
+
+def _load_and_split(file_path: str):
+    """Load and split a document in a worker process, returning (page count, chunks)"""
+    # Determine the file type from its content; anything that is not a PDF
+    # is loaded as text
+    is_text_file = not is_pdf_file(file_path)
+    
+    # Load the document with the appropriate loader
+    if is_text_file:
+        logger.info(f"Loading text file: {file_path}")
+        loader = TextLoader(file_path, encoding='utf-8')
+        docs = loader.load()
+    else:
+        logger.info(f"Loading PDF file: {file_path}")
+        loader = PyMuPDFLoader(file_path)
+        docs = loader.load()
+    
+    # Split the document into chunks sized in embedding-model tokens
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name="cl100k_base",
+        chunk_size=512,
+        chunk_overlap=64,
+        separators=["\n\n", "\n", ".", " ", ""],
+    )
+    
+    chunks = text_splitter.split_documents(docs)
+    return len(docs), chunks
+
+@retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type((openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)),
+    reraise=True,
+)
+async def invoke_llm(llm, messages):
+    """Call the LLM under the shared concurrency limit, with jittered exponential backoff"""
+    async with llm_semaphore:
+        return await llm.ainvoke(messages)
+
+async def _parse_document(document_id: str, file_path: str):
+    """Parse and split one document, returning its chunks or None if it failed"""
+    try:
+        # Update document status
+        await asyncio.to_thread(document_store.update, document_id, status="processing")
+        
+        # Sniff, parse and split in a worker process so the event loop stays free
+        loop = asyncio.get_running_loop()
+        page_count, chunks = await loop.run_in_executor(
+            get_process_pool(), _load_and_split, file_path
+        )
+        
+        # Update document metadata with chunk count
+        await asyncio.to_thread(document_store.update, document_id, chunks=len(chunks), pages=page_count)
+        return chunks
+    
+    except Exception as e:
+        # Update document status
+        await asyncio.to_thread(document_store.update, document_id, status="failed", error=str(e))
+        logger.error(f"Error processing document {document_id}: {str(e)}")
+        return None
+
+def _drop_retrieval_cache(document_id: str):
+    """Drop this worker's cached retrievals for a document"""
+    for cache_key in [key for key in _retrieval_cache if key[0] == document_id]:
+        _retrieval_cache.pop(cache_key, None)
+
+def _save_index(document_id: str, chunks, vectors, embeddings):
+    """
+    Build, save and cache the FAISS index of one document from its chunk vectors
+    
+    Blocks on FAISS and disk I/O, so async callers run it in a worker thread.
+    """
+    collection_name = f"doc_{document_id}"
+    
+    # Path for this specific collection's FAISS index
+    index_path = os.path.join(str(VECTOR_DB_DIR), collection_name)
+    
+    # Build the FAISS index from the precomputed vectors
+    texts = [chunk.page_content for chunk in chunks]
+    vector_store = FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[chunk.metadata for chunk in chunks]
+    )
+    
+    # Save the index
+    vector_store.save_local(index_path)
+    logger.info(f"Saved FAISS index for {collection_name}")
+    
+    # Serve retrievals from the new index without reloading it from disk
+    indexed_at = time.time()
+    _cache_vector_store(collection_name, indexed_at, vector_store)
+    
+    # Update document status, recording the vector size so an index built
+    # with other embedding settings is detected before it is searched
+    document_store.update(
+        document_id,
+        status="indexed",
+        indexed_at=indexed_at,
+        embedding_dimensions=vector_store.index.d
+    )
+    
+    logger.info(f"Document {document_id} indexed successfully with {len(chunks)} chunks")
+
+async def process_documents(documents: List[tuple]):
+    """
+    Index several documents, embedding the chunks of all of them together
+    
+    Args:
+        documents: (document_id, file_path) pairs
+    """
+    # Parse all documents concurrently in the process pool
+    parsed = await asyncio.gather(
+        *[_parse_document(document_id, file_path) for document_id, file_path in documents]
+    )
+    ready = [
+        (document_id, chunks)
+        for (document_id, _), chunks in zip(documents, parsed)
+        if chunks is not None
+    ]
+    if not ready:
+        return
+    
+    # Embed every document's chunks in one call so the embedding requests
+    # are filled to the batch size, off the event loop
+    try:
+        embeddings = get_embeddings()
+        texts = [chunk.page_content for _, chunks in ready for chunk in chunks]
+        vectors = await asyncio.to_thread(embeddings.embed_documents, texts)
+    except Exception as e:
+        for document_id, _ in ready:
+            await asyncio.to_thread(document_store.update, document_id, status="failed", error=str(e))
+        logger.error(f"Error embedding documents: {str(e)}")
+        return
+    
+    # Split the vectors back out and build each document's index. Building
+    # and saving are CPU and disk bound, so they run off the event loop.
+    offset = 0
+    for document_id, chunks in ready:
+        document_vectors = vectors[offset:offset + len(chunks)]
+        offset += len(chunks)
+        try:
+            await asyncio.to_thread(_save_index, document_id, chunks, document_vectors, embeddings)
+            _drop_retrieval_cache(document_id)
+        except Exception as e:
+            await asyncio.to_thread(document_store.update, document_id, status="failed", error=str(e))
+            logger.error(f"Error processing document {document_id}: {str(e)}")
+
+async def process_document(document_id: str, file_path: str, file_name: str):
+    """Process a document by adding it to the vector store"""
+    await process_documents([(document_id, file_path)])
+
+def build_retrieval_query(fields: List[ExtractionField]):
+    """Build one combined retrieval query covering every field, and its result count"""
+    query = "Find information about " + "; ".join(
+        f"{field.name}: {field.description}" for field in fields
+    )
+    return query, min(3 * len(fields), 10)
+
+def _retrieval_cache_key(document_id: str, indexed_at: Optional[float], query: str, k: int):
+    return (document_id, indexed_at, hashlib.md5(query.encode()).hexdigest(), k)
+
+async def extract_all_fields(document_id: str, task_id: str, fields: List[ExtractionField], query_vector=None,
+                             indexed_at: Optional[float] = None):
+    """
+    Extract all requested fields from a document with one retrieval and one LLM call
+    
+    Args:
+        query_vector: Precomputed embedding of the retrieval query, if available
+        indexed_at: The document's indexed_at from the shared state
+    """
+    field_names = [field.name for field in fields]
+    
+    try:
+        # Update field status
+        started_at = time.time()
+        await asyncio.to_thread(extraction_tasks.update_fields, task_id, {
+            field_name: {
+                "status": "processing",
+                "result": None,
+                "error": None,
+                "started_at": started_at
+            } for field_name in field_names
+        })
+        
+        # Define the RAG steps
+        async def retrieve(state):
+            """Retrieve chunks relevant to any of the requested fields"""
+            try:
+                collection_name = f"doc_{document_id}"
+                vector_store = await asyncio.to_thread(get_vector_store, collection_name, indexed_at)
+                
+                # Construct one combined query covering every field
+                query, k = build_retrieval_query(fields)
+                
+                # Retrieve relevant chunks, reusing an earlier identical search.
+                # The FAISS search runs in a worker thread to keep the loop free.
+                cache_key = _retrieval_cache_key(document_id, indexed_at, query, k)
+                docs = _retrieval_cache.get(cache_key)
+                if docs is not None:
+                    _retrieval_cache.move_to_end(cache_key)
+                else:
+                    if query_vector is not None:
+                        docs = await asyncio.to_thread(vector_store.similarity_search_by_vector, query_vector, k=k)
+                    else:
+                        docs = await asyncio.to_thread(vector_store.similarity_search, query, k=k)
+                    _retrieval_cache[cache_key] = docs
+                    if len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+                        _retrieval_cache.popitem(last=False)
+                
+                # Extract and combine text from chunks
+                context = "\n\n".join([doc.page_content for doc in docs])
+                
+                return {
+                    "context": context,
+                    "query": query
+                }
+            except Exception as e:
+                logger.error(f"Error in retrieve step for task {task_id}: {str(e)}")
+                return {
+                    "context": "",
+                    "query": "",
+                    "error": str(e)
+                }
+        
+        async def generate(state):
+            """Extract every field's value from the retrieved context"""
+            try:
+                # If there was an error in the retrieve step
+                if "error" in state:
+                    return {"fields": {}, "error": state["error"]}
+                
+                context = state["context"]
+                
+                # If context is empty, we can't extract anything
+                if not context:
+                    return {"fields": {}, "error": "No relevant content found for these fields"}
+                
+                field_list = "\n".join(f"- {field.name}: {field.description}" for field in fields)
+                
+                # Set up messages for the LLM
+                system_msg = SystemMessage(content=f"""
+                You are a financial document extraction expert. Extract specific data from document excerpts.
+                If the information for a field is not present in the provided text, use null as its value.
+                Always respond with valid JSON in this format:
+                {{
+                    "fields": {{
+                        "field_name": {{
+                            "value": extracted_value_or_null,
+                            "confidence": number_between_0_and_1
+                        }}
+                    }}
+                }}
+                """)
+                
+                human_msg = HumanMessage(content=f"""
+                I need to extract the values for these fields from this document:
+                {field_list}
+                
+                Here is the text to extract from:
+                ---
+                {context}
+                ---
+                
+                Extract only the precise value for each field, keyed by the field name exactly as given.
+                If the information is not present, return null for its value. Provide a confidence
+                score between 0 and 1 for each field.
+                """)
+                
+                # Get LLM
+                llm = get_llm()
+                
+                # Call LLM, retrying rate limits and transient connection errors
+                try:
+                    response = await invoke_llm(llm, [system_msg, human_msg])
+                except Exception as e:
+                    logger.error(f"LLM call failed for task {task_id}: {str(e)}")
+                    return {"fields": {}, "error": str(e)}
+                
+                # Parse response
+                try:
+                    result = orjson.loads(response.content)
+                    return {"fields": result.get("fields") or {}}
+                except Exception as e:
+                    logger.error(f"Error parsing LLM response for task {task_id}: {str(e)}")
+                    return {"fields": {}, "error": f"Error parsing response: {str(e)}"}
+            
+            except Exception as e:
+                logger.error(f"Error in generate step for task {task_id}: {str(e)}")
+                return {"fields": {}, "error": str(e)}
+        
+        # Run the two RAG steps in sequence
+        state = await retrieve({})
+        result = await generate(state)
+        
+        # Fan the results back out to the individual fields
+        completed_at = time.time()
+        values = result.get("fields") or {}
+        field_updates = {}
+        for field_name in field_names:
+            value = values.get(field_name)
+            if field_name not in values and result.get("error"):
+                field_updates[field_name] = {
+                    "status": "failed",
+                    "result": None,
+                    "error": result["error"],
+                    "completed_at": completed_at
+                }
+            else:
+                if not isinstance(value, dict):
+                    value = {"value": value}
+                field_updates[field_name] = {
+                    "status": "completed",
+                    "result": value.get("value"),
+                    "confidence": value.get("confidence", 0.0),
+                    "completed_at": completed_at
+                }
+        task = await asyncio.to_thread(extraction_tasks.update_fields, task_id, field_updates)
+        
+        # Check if all fields are completed
+        all_completed = all(
+            field_task["status"] in ["completed", "failed"] 
+            for field_task in task["fields"].values()
+        )
+        
+        if all_completed:
+            await asyncio.to_thread(extraction_tasks.update, task_id, status="completed", completed_at=time.time())
+            
+            # Store extraction results
+            await asyncio.to_thread(extraction_results.set, task_id, {
+                "document_id": document_id,
+                "task_id": task_id,
+                "fields": {
+                    field: field_task["result"] 
+                    for field, field_task in task["fields"].items()
+                },
+                "completed_at": time.time()
+            })
+            
+        logger.info(f"Field extraction completed for task {task_id}")
+        
+    except Exception as e:
+        logger.error(f"Error extracting fields for task {task_id}: {str(e)}")
+        # Even in case of error, we want to make sure the field statuses are updated
+        await asyncio.to_thread(extraction_tasks.update_fields, task_id, {
+            field_name: {
+                "status": "failed",
+                "result": None,
+                "error": str(e),
+                "completed_at": time.time()
+            } for field_name in field_names
+        })
+
+async def run_extraction(document_id: str, task_id: str, fields: List[ExtractionField]):
+    """Extract fields in batches, running the batches concurrently"""
+    document = await asyncio.to_thread(document_store.get, document_id, {})
+    indexed_at = document.get("indexed_at")
+    batches = [
+        fields[i:i + FIELD_BATCH_SIZE]
+        for i in range(0, len(fields), FIELD_BATCH_SIZE)
+    ]
+    
+    # Embed the retrieval queries of all uncached batches in one request
+    query_vectors = [None] * len(batches)
+    pending = []
+    for i, batch in enumerate(batches):
+        query, k = build_retrieval_query(batch)
+        if _retrieval_cache_key(document_id, indexed_at, query, k) not in _retrieval_cache:
+            pending.append((i, query))
+    if len(pending) > 1:
+        try:
+            vectors = await asyncio.to_thread(
+                get_embeddings().embed_documents, [query for _, query in pending]
+            )
+            for (i, _), vector in zip(pending, vectors):
+                query_vectors[i] = vector
+        except Exception as e:
+            # Each batch falls back to embedding its own query
+            logger.warning(f"Batched query embedding failed for task {task_id}: {str(e)}")
+    
+    await asyncio.gather(
+        *[
+            extract_all_fields(document_id, task_id, batch, query_vector, indexed_at)
+            for batch, query_vector in zip(batches, query_vectors)
+        ],
+        return_exceptions=True
+    )
+
+def _save_upload(source, file_path) -> Tuple[str, int]:
+    """Copy an upload to disk, returning its SHA-256 hex digest and size in bytes"""
+    sha256 = save_stream(source, file_path)
+    return sha256, os.path.getsize(file_path)
+
+async def _store_upload(file: UploadFile):
+    """Save an uploaded file and register it as a pending document"""
+    # Generate document ID
+    document_id = str(uuid.uuid4())
+    
+    # Save file, keeping only the final component of the client's filename
+    file_path = UPLOAD_DIR / f"{document_id}_{Path(file.filename or 'upload').name}"
+    
+    # Copy the upload in a worker thread so the event loop keeps serving
+    # other requests while large files are written
+    sha256, size = await asyncio.to_thread(_save_upload, file.file, file_path)
+    
+    # Store document metadata
+    await asyncio.to_thread(document_store.set, document_id, {
+        "id": document_id,
+        "filename": file.filename,
+        "uploaded_at": time.time(),
+        "status": "pending",
+        "file_path": str(file_path),
+        "size": size,
+        "sha256": sha256
+    })
+    
+    return document_id, str(file_path)
+
+# API endpoints
+@app.post("/api/upload", response_model=DocumentUploadResponse)
+async def upload_document(
+    background_tasks: BackgroundTasks, 
+    file: UploadFile = File(...),
+):
+    """
+    Upload and index a document
+    
+    This endpoint handles document upload and initiates background indexing.
+    
+    Returns:
+        DocumentUploadResponse: Upload response with document ID
+    """
+    try:
+        document_id, file_path = await _store_upload(file)
+        
+        # Start background processing
+        background_tasks.add_task(
+            process_document, document_id, file_path, file.filename
+        )
+        
+        return DocumentUploadResponse(
+            success=True,
+            document_id=document_id,
+            indexing_status="pending"
+        )
+    
+    except Exception as e:
+        logger.error(f"Error uploading document: {str(e)}")
+        return DocumentUploadResponse(
+            success=False,
+            error=str(e)
+        )
+
+@app.post("/api/upload/batch", response_model=BatchUploadResponse)
+async def upload_documents(
+    background_tasks: BackgroundTasks, 
+    files: List[UploadFile] = File(...),
+):
+    """
+    Upload and index several documents in one request
+    
+    All successfully saved documents are indexed together, so their chunks
+    share batched embedding requests.
+    
+    Returns:
+        BatchUploadResponse: One upload response per file, in request order
+    """
+    results = []
+    documents = []
+    
+    for file in files:
+        try:
+            document_id, file_path = await _store_upload(file)
+            documents.append((document_id, file_path))
+            results.append(DocumentUploadResponse(
+                success=True,
+                document_id=document_id,
+                indexing_status="pending"
+            ))
+        except Exception as e:
+            logger.error(f"Error uploading document {file.filename}: {str(e)}")
+            results.append(DocumentUploadResponse(
+                success=False,
+                error=str(e)
+            ))
+    
+    # Start one background task indexing all saved documents
+    if documents:
+        background_tasks.add_task(process_documents, documents)
+    
+    return BatchUploadResponse(
+        success=bool(documents),
+        documents=results
+    )
+
+@app.get("/api/document/{document_id}/status")
+async def get_document_status(document_id: str):
+    """
+    Get document indexing status
+    
+    This endpoint returns the current status of document indexing.
+    
+    Args:
+        document_id: ID of the document
+        
+    Returns:
+        JSON with document status information
+    """
+    try:
+        document = await asyncio.to_thread(document_store.get, document_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
+        
+        return ORJSONResponse(content={
+            "success": True,
+            "document_id": document_id,
+            "status": document["status"],
+            "filename": document["filename"],
+            "uploaded_at": document["uploaded_at"],
+            "indexed_at": document.get("indexed_at"),
+            "chunks": document.get("chunks"),
+            "pages": document.get("pages"),
+            "error": document.get("error")
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting document status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/extract", response_model=ExtractionResponse)
+async def extract_data(
+    background_tasks: BackgroundTasks,
+    request: ExtractionRequest,
+):
+    """
+    Extract data from a document
+    
+    This endpoint initiates asynchronous field extraction using RAG.
+    
+    Args:
+        request: Extraction request with document ID and fields
+        
+    Returns:
+        ExtractionResponse: Response with task ID for status tracking
+    """
+    try:
+        document_id = request.document_id
+        
+        # Check if document exists and is indexed
+        document = await asyncio.to_thread(document_store.get, document_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
+        
+        if document["status"] != "indexed":
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Document {document_id} is not ready for extraction (status: {document['status']})"
+            )
+        
+        # An index built with another embedding size cannot be searched with
+        # the current model's query vectors. Re-index the upload if it is
+        # still on disk, otherwise the document must be uploaded again.
+        dimensions = await asyncio.to_thread(get_index_dimensions, document)
+        expected = await asyncio.to_thread(get_embedding_dimensions)
+        if dimensions != expected:
+            detail = (
+                f"Document {document_id} was indexed with {dimensions}-dimensional embeddings, "
+                f"but the embeddings model returns {expected}"
+            )
+            if not os.path.exists(document["file_path"]):
+                raise HTTPException(status_code=409, detail=f"{detail}; upload it again")
+            
+            await asyncio.to_thread(document_store.update, document_id, status="pending", error=None)
+            background_tasks.add_task(
+                process_document, document_id, document["file_path"], document["filename"]
+            )
+            # Returned rather than raised, so the re-indexing task still runs
+            return ORJSONResponse(
+                status_code=409,
+                content={"detail": f"{detail}; it is being re-indexed, retry once its status is indexed"}
+            )
+        
+        # Generate task ID
+        task_id = str(uuid.uuid4())
+        
+        # Initialize extraction task
+        await asyncio.to_thread(extraction_tasks.set, task_id, {
+            "document_id": document_id,
+            "task_id": task_id,
+            "status": "pending",
+            "created_at": time.time(),
+            "fields": {
+                field.name: {
+                    "status": "pending",
+                    "result": None,
+                    "error": None
+                } for field in request.fields
+            }
+        })
+        
+        # Start one background task that runs the field batches concurrently
+        background_tasks.add_task(
+            run_extraction, document_id, task_id, request.fields
+        )
+        
+        # Update task status
+        await asyncio.to_thread(extraction_tasks.update, task_id, status="processing")
+        
+        return ExtractionResponse(
+            success=True,
+            document_id=document_id,
+            task_id=task_id,
+            message="Extraction started"
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting extraction: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/extract/{task_id}/status", response_model=ExtractionStatusResponse)
+async def get_extraction_status(task_id: str):
+    """
+    Get extraction task status
+    
+    This endpoint returns the current status of an extraction task.
+    
+    Args:
+        task_id: ID of the extraction task
+        
+    Returns:
+        ExtractionStatusResponse: Current status of the extraction task
+    """
+    try:
+        task = await asyncio.to_thread(extraction_tasks.get, task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail=f"Extraction task {task_id} not found")
+        
+        # Prepare field status list
+        fields = [
+            FieldExtractionStatus(
+                field_name=field_name,
+                status=info["status"],
+                result=info.get("result"),
+                error=info.get("error")
+            )
+            for field_name, info in task["fields"].items()
+        ]
+        
+        # Check if all fields are completed
+        all_completed = all(
+            field.status in ["completed", "failed"] for field in fields
+        )
+        
+        return ExtractionStatusResponse(
+            success=True,
+            document_id=task["document_id"],
+            task_id=task_id,
+            status=task["status"],
+            fields=fields,
+            completed=all_completed
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting extraction status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _extraction_events(task_id: str):
+    """Yield server-sent events as the fields of an extraction task change"""
+    sent = {}
+    deadline = time.monotonic() + EVENT_STREAM_TIMEOUT
+    while True:
+        task = await asyncio.to_thread(extraction_tasks.get, task_id)
+        if task is None:
+            return
+        
+        # Only send fields whose state changed since the last check
+        for field_name, info in task["fields"].items():
+            if sent.get(field_name) != info:
+                sent[field_name] = info
+                event = {"field_name": field_name, **info}
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        
+        if task["status"] in ("completed", "failed") or all(
+            info["status"] in ("completed", "failed") for info in task["fields"].values()
+        ):
+            yield b"event: done\ndata: " + orjson.dumps({"status": task["status"]}) + b"\n\n"
+            return
+        
+        # Don't keep polling forever for a task that never finishes
+        if time.monotonic() >= deadline:
+            yield b"event: timeout\ndata: " + orjson.dumps({"status": task["status"]}) + b"\n\n"
+            return
+        
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+@app.get("/api/extract/{task_id}/events")
+async def stream_extraction_events(task_id: str):
+    """
+    Stream extraction task progress
+    
+    This endpoint sends a server-sent event whenever a field of the task
+    changes, and a final 'done' event, so clients need not poll the status
+    endpoint. Streams still open after EVENT_STREAM_TIMEOUT seconds end with
+    a 'timeout' event instead; clients can reconnect or poll.
+    
+    Args:
+        task_id: ID of the extraction task
+        
+    Returns:
+        StreamingResponse of text/event-stream events
+    """
+    if await asyncio.to_thread(extraction_tasks.get, task_id) is None:
+        raise HTTPException(status_code=404, detail=f"Extraction task {task_id} not found")
+    
+    return StreamingResponse(
+        _extraction_events(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/extract/{task_id}/result")
+async def get_extraction_result(task_id: str):
+    """
+    Get extraction task result
+    
+    This endpoint returns the results of a completed extraction task.
+    
+    Args:
+        task_id: ID of the extraction task
+        
+    Returns:
+        JSON with extraction results
+    """
+    try:
+        # Check if task exists
+        task = await asyncio.to_thread(extraction_tasks.get, task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail=f"Extraction task {task_id} not found")
+        
+        # Check if task is completed
+        if task["status"] != "completed":
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Extraction task {task_id} is not completed (status: {task['status']})"
+            )
+        
+        # Return results
+        return ORJSONResponse(content={
+            "success": True,
+            "document_id": task["document_id"],
+            "task_id": task_id,
+            "created_at": task["created_at"],
+            "completed_at": task.get("completed_at"),
+            "fields": {
+                field_name: info.get("result")
+                for field_name, info in task["fields"].items()
+                if info["status"] == "completed"
+            }
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting extraction result: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/documents")
+async def list_documents():
+    """
+    List all documents
+    
+    This endpoint returns a list of all documents in the system.
+    
+    Returns:
+        JSON with list of documents
+    """
+    try:
+        documents = []
+        
+        for doc_id, doc in await asyncio.to_thread(lambda: list(document_store.items())):
+            documents.append({
+                "id": doc_id,
+                "filename": doc["filename"],
+                "status": doc["status"],
+                "uploaded_at": doc["uploaded_at"],
+                "indexed_at": doc.get("indexed_at"),
+                "chunks": doc.get("chunks"),
+                "pages": doc.get("pages")
+            })
+        
+        return ORJSONResponse(content={
+            "success": True,
+            "documents": documents,
+            "count": len(documents)
+        })
+    
+    except Exception as e:
+        logger.error(f"Error listing documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Health check endpoint
+@app.get("/api/health")
+async def health_check():
+    """
+    Health check endpoint
+    
+    Returns:
+        JSON with service status
+    """
+    return ORJSONResponse(content={
+        "status": "ok",
+        "timestamp": time.time(),
+        "version": "1.0.0"
+    })
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
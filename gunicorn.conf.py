@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration
+
+Gunicorn loads this file from the working directory, so both applications
+pick it up without extra flags:
+
+    gunicorn main:app                                           # Flask (WSGI)
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:application  # FastAPI (ASGI)
+
+Uvicorn workers use uvloop and the httptools parser when they are installed,
+which the uvicorn[standard] extra provides.
+
+Document and task state lives in the shared state database, so any worker can
+serve any request.
+"""
+
+import os
+import multiprocessing
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Two workers per core plus one (2N+1), as headroom for workers blocked on
+# I/O. Each worker also starts a small document parsing process pool on first
+# use (PROCESS_POOL_WORKERS, default up to 4 processes).
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers for the Flask app; override with -k for the ASGI app. Use
+# an async class such as gevent if clients keep extraction event streams open,
+# since each open stream holds a thread.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Heartbeat files on tmpfs, so a slow disk cannot stall worker health checks
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+keepalive = 30
+
+# Extraction requests wait on the LLM; leave room before killing a worker
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
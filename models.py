@@ -6,11 +6,16 @@ import os
 import json
 import time
 import uuid
-import threading
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, BinaryIO, List, Optional, Union
 from pydantic import BaseModel, Field
 
+from utils import extraction_cache
+from utils.uploads import save_stream
+
 # Set up logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -22,12 +27,20 @@ document_store = {}
 # Dictionary mapping document IDs to their extraction results
 extraction_results = {}
 
-# Dictionary to track active extraction jobs
+# Dictionary to track active extraction jobs (document ID -> Future)
 active_jobs = {}
 
+# Vectorization and extraction jobs run on a bounded pool, so a burst of
+# uploads queues work instead of starting a thread per document
+BACKGROUND_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", "4"))
+EXECUTOR = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS)
+
 # Dictionary to store document binary data (would be file system or blob storage in production)
 document_binary_store = {}
 
+# Directory for documents stored from streams rather than in memory
+UPLOAD_DIR = "uploads"
+
 
 class ExtractionField(BaseModel):
     """Model for a single extraction field"""
@@ -78,13 +91,28 @@ def generate_document_id() -> str:
     return str(uuid.uuid4())
 
 
-def store_document(filename: str, file_content: bytes) -> DocumentUploadResponse:
+def _get_document_content(document_id: str) -> Optional[bytes]:
+    """Get a stored document's bytes, from memory or from its upload file"""
+    if document_id in document_binary_store:
+        return document_binary_store[document_id]
+    
+    file_path = document_store.get(document_id, {}).get("file_path")
+    if file_path and os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read()
+    return None
+
+
+def store_document(filename: str, file_content: Union[bytes, BinaryIO]) -> DocumentUploadResponse:
     """
     Store a document in the document store and add it to ChromaDB vector store
     
+    File-like objects (e.g. an upload stream) are copied to the uploads
+    directory in chunks, so the request never holds the whole file in memory.
+    
     Args:
         filename: Original filename
-        file_content: Binary content of the document
+        file_content: Binary content of the document, or a readable binary stream
         
     Returns:
         DocumentUploadResponse with success status and document ID
@@ -103,8 +131,17 @@ def store_document(filename: str, file_content: bytes) -> DocumentUploadResponse
             "error": None
         }
         
-        # Store the binary content
-        document_binary_store[document_id] = file_content
+        # The content hash keys cached extraction results for this document
+        if hasattr(file_content, 'read'):
+            # Stream the content to disk, hashing it on the way, and keep only its path
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            file_path = os.path.join(UPLOAD_DIR, f"{document_id}_{os.path.basename(filename)}")
+            document_store[document_id]["sha256"] = save_stream(file_content, file_path)
+            document_store[document_id]["file_path"] = file_path
+        else:
+            # Store the binary content
+            document_binary_store[document_id] = file_content
+            document_store[document_id]["sha256"] = hashlib.sha256(file_content).hexdigest()
         
         logger.info(f"Document {document_id} ({filename}) stored successfully, starting vectorization")
         
@@ -115,7 +152,7 @@ def store_document(filename: str, file_content: bytes) -> DocumentUploadResponse
         def vectorization_worker():
             try:
                 # Add the document to the vector store
-                result = add_document_to_vector_store(document_id, file_content)
+                result = add_document_to_vector_store(document_id, _get_document_content(document_id))
                 
                 if result.get("success", False):
                     # Update document status to indicate successful vectorization
@@ -132,10 +169,8 @@ def store_document(filename: str, file_content: bytes) -> DocumentUploadResponse
                 document_store[document_id]["error"] = str(e)
                 logger.error(f"Error in vectorization worker for document {document_id}: {str(e)}")
         
-        # Start the vectorization in a background thread
-        thread = threading.Thread(target=vectorization_worker)
-        thread.daemon = True
-        thread.start()
+        # Queue the vectorization on the background pool
+        EXECUTOR.submit(vectorization_worker)
         
         return DocumentUploadResponse(
             success=True,
@@ -217,6 +252,26 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
             "completed_time": None
         }
     
+    # Serve a repeat extraction of the same content and schema from the cache
+    cache_key = None
+    sha256 = document_store.get(document_id, {}).get("sha256")
+    if sha256 and schema and "fields" in schema and extraction_cache.is_enabled():
+        cache_key = extraction_cache.make_key(sha256, schema)
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for document {document_id}")
+            document_store[document_id]["status"] = "completed"
+            extraction_results[document_id].update(
+                success=True, data=cached, error=None, completed_time=time.time()
+            )
+            for field in schema["fields"]:
+                name = field.get("name", "") if isinstance(field, dict) else field
+                document_store[document_id]["extraction_status"][name] = "completed"
+            
+            if callback:
+                callback(document_id, extraction_results[document_id])
+            return document_id
+    
     def extraction_worker():
         try:
             # Update document status to processing
@@ -242,7 +297,8 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
             logger.info(f"Attempting to extract data from document {document_id} using vector store")
             
             # Check if document binary content is available
-            if document_id not in document_binary_store:
+            file_content = _get_document_content(document_id)
+            if file_content is None:
                 error_msg = f"Document binary content not found for {document_id}"
                 document_store[document_id]["status"] = "failed"
                 document_store[document_id]["error"] = error_msg
@@ -270,6 +326,8 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
                         extraction_results[document_id]["success"] = True
                         extraction_results[document_id]["data"] = result.get("data", {})
                         extraction_results[document_id]["completed_time"] = time.time()
+                        if cache_key:
+                            extraction_cache.put(cache_key, extraction_results[document_id]["data"])
                         
                         # Update extraction status for each field
                         field_progress = result.get("field_progress", {})
@@ -297,9 +355,6 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
             # Fallback to direct extraction if vector store failed or document is not ready
             logger.info(f"Using fallback direct extraction for document {document_id}")
             
-            # Extract data directly from the document
-            file_content = document_binary_store[document_id]
-            
             # Write content to a temporary file
             import tempfile
             import os
@@ -337,6 +392,8 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
                     extraction_results[document_id]["success"] = True
                     extraction_results[document_id]["data"] = extract_result.get("data", {})
                     extraction_results[document_id]["completed_time"] = time.time()
+                    if cache_key:
+                        extraction_cache.put(cache_key, extraction_results[document_id]["data"])
                     
                     # Update extraction status for fields
                     for field_name in schema.get("fields", []):
@@ -356,8 +413,7 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
                     logger.error(f"Error in direct extraction for document {document_id}: {error_msg}")
             finally:
                 # Clean up the temporary file
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
+                Path(tmp_path).unlink(missing_ok=True)
             
             # Remove the document from active jobs
             if document_id in active_jobs:
@@ -387,15 +443,16 @@ def async_extract_document(document_id: str, schema: Optional[Dict[str, Any]] =
             if callback:
                 callback(document_id, {"success": False, "error": str(e)})
     
-    # Create a thread for extraction
-    thread = threading.Thread(target=extraction_worker)
-    thread.daemon = True
+    # Queue the extraction on the background pool and track it in active jobs
+    future = EXECUTOR.submit(extraction_worker)
+    active_jobs[document_id] = future
     
-    # Store the thread in active jobs
-    active_jobs[document_id] = thread
+    # The job may finish before it is recorded above, so drop it here too
+    def _job_done(done):
+        if active_jobs.get(document_id) is done:
+            del active_jobs[document_id]
     
-    # Start the thread
-    thread.start()
+    future.add_done_callback(_job_done)
     
     logger.info(f"Started async extraction for document {document_id} using vector store")
     return document_id
@@ -425,6 +482,11 @@ def cleanup_document(document_id: str) -> bool:
         except Exception as ve:
             logger.warning(f"Error cleaning up vector store for document {document_id}: {str(ve)}")
         
+        # Remove a streamed upload's file
+        file_path = document_store[document_id].get("file_path")
+        if file_path:
+            Path(file_path).unlink(missing_ok=True)
+        
         # Remove the document from the stores
         if document_id in document_store:
             del document_store[document_id]
@@ -1,10 +1,32 @@
 """
 FastAPI Server Setup
 This file contains the server setup for running the FastAPI application.
+
+Runs uvicorn with the uvloop event loop and the httptools parser when they
+are installed (both come with the uvicorn[standard] extra), and with the
+asyncio loop and h11 parser otherwise. Worker count, concurrency limit and listen
+backlog can be set through the environment; set UVICORN_RELOAD=1 for
+development, which runs a single reloading worker.
 """
 
+import os
+
 import uvicorn
 
 if __name__ == "__main__":
+    reload = os.environ.get("UVICORN_RELOAD", "").lower() in ("1", "true", "yes")
+    limit_concurrency = os.environ.get("UVICORN_LIMIT_CONCURRENCY")
+    
     # Run the FastAPI app with uvicorn (ASGI server)
-    uvicorn.run("app:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
+    uvicorn.run(
+        "asgi:application",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "5000")),
+        loop="auto",
+        http="auto",
+        reload=reload,
+        workers=None if reload else int(os.environ.get("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        # Answer 503 beyond this many concurrent connections and tasks
+        limit_concurrency=int(limit_concurrency) if limit_concurrency else None,
+        backlog=int(os.environ.get("UVICORN_BACKLOG", "2048")),
+    )
@@ -1,2 +1,2 @@
 #!/bin/bash
-python -m flask --app app run --host=0.0.0.0 --port=5000
\ No newline at end of file
+exec gunicorn main:app
@@ -0,0 +1,34 @@
+"""
+Test that the ASGI entry point loads the FastAPI application
+
+asgi:application is what server.py, gunicorn (with uvicorn workers) and the
+docs point at, so it must resolve to the FastAPI app rather than to the api/
+package or the Flask app.
+"""
+
+from fastapi import FastAPI
+
+
+def test_asgi_application_is_the_fastapi_app():
+    """asgi.application is the FastAPI app defined in fastapi_app.py"""
+    import asgi
+    import fastapi_app
+
+    assert isinstance(asgi.application, FastAPI)
+    assert asgi.application is fastapi_app.app
+
+
+def test_asgi_application_serves_the_extraction_api():
+    """The loaded app exposes the upload and extraction routes"""
+    import asgi
+
+    paths = {route.path for route in asgi.application.routes}
+    assert "/api/upload" in paths
+    assert "/api/extract" in paths
+    assert "/api/health" in paths
+
+
+if __name__ == "__main__":
+    test_asgi_application_is_the_fastapi_app()
+    test_asgi_application_serves_the_extraction_api()
+    print("ASGI entry point loads the FastAPI app")
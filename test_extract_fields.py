@@ -0,0 +1,66 @@
+"""
+Test the per-field fallback of batch extraction in the vector service
+
+The combined and single-field LLM calls are replaced with stubs, and document
+state is kept in a temporary database, so no API key or Chroma is needed.
+"""
+
+import asyncio
+
+import pytest
+
+from api import vector_service
+from api.models import DocumentStatus, FieldStatus
+from utils.state_store import StateStore
+
+FIELDS = [
+    {"name": "invoice_number", "description": "The invoice number"},
+    {"name": "total", "description": "The total amount"},
+]
+
+
+@pytest.fixture
+def document(tmp_path, monkeypatch):
+    """Record an indexed document in isolated state, and stub the LLM calls"""
+    db_path = str(tmp_path / "state.db")
+    monkeypatch.setattr(vector_service, "document_metadata", StateStore("vector_documents", db_path=db_path))
+    monkeypatch.setattr(vector_service, "document_statuses", StateStore("vector_document_statuses", db_path=db_path))
+
+    vector_service.document_metadata["doc-1"] = {"filename": "invoice.txt"}
+    vector_service.update_document_status("doc-1", DocumentStatus.INDEXED)
+
+    async def extract_fields_batch(document_id, fields, use_full_text=False):
+        return {"success": False, "document_id": document_id, "error": "combined call failed"}
+
+    async def extract_field(document_id, field_name, field_description=None):
+        if field_name == "total":
+            return {"success": False, "document_id": document_id, "field_name": field_name, "error": "no total"}
+        return {"success": True, "document_id": document_id, "field_name": field_name, "value": "42"}
+
+    monkeypatch.setattr(vector_service, "_extract_fields_batch_async", extract_fields_batch)
+    monkeypatch.setattr(vector_service, "_extract_field_async", extract_field)
+    return "doc-1"
+
+
+def test_failed_combined_call_extracts_fields_separately(document):
+    """Each field is extracted on its own and gets the status of its own result"""
+    async def run():
+        # batch_extract_fields sets the document to EXTRACTING before the task runs
+        started = await vector_service.batch_extract_fields(document, FIELDS)
+        assert started["success"]
+        await asyncio.gather(*vector_service._background_tasks)
+
+    asyncio.run(run())
+
+    field_statuses = vector_service.get_document_status(document)["field_statuses"]
+    assert field_statuses == {"invoice_number": FieldStatus.COMPLETED, "total": FieldStatus.FAILED}
+
+
+def test_fallback_returns_each_field_value(document):
+    """The fallback result holds the values of the fields that were found"""
+    vector_service.update_document_status(document, DocumentStatus.EXTRACTING)
+
+    result = asyncio.run(vector_service.extract_fields(document, FIELDS))
+
+    assert not result["success"]
+    assert result["values"] == {"invoice_number": "42", "total": None}
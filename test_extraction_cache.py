@@ -0,0 +1,115 @@
+"""
+Test the extraction result cache
+
+The cache directory is pointed at a temporary directory per test, so the
+tests never read or write a configured EXTRACTION_CACHE_DIR.
+"""
+
+import os
+import hashlib
+
+import pytest
+
+from utils import extraction_cache
+
+CONTENT_SHA256 = hashlib.sha256(b"%PDF-1.7 test document").hexdigest()
+SCHEMA = {"fields": [{"name": "invoice_number", "description": "Invoice number"}]}
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Enable the cache in a temporary directory"""
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_disabled_without_cache_dir(monkeypatch):
+    """With EXTRACTION_CACHE_DIR unset, get always misses and put writes nothing"""
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE_DIR", None)
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+
+    assert not extraction_cache.is_enabled()
+    extraction_cache.put(key, {"invoice_number": "42"})
+    assert extraction_cache.get(key) is None
+
+
+def test_miss(cache_dir):
+    """An unknown key is a miss"""
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+    assert extraction_cache.get(key) is None
+
+
+def test_hit(cache_dir):
+    """Stored data is returned for the same document and schema only"""
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+    extraction_cache.put(key, {"invoice_number": "42"})
+
+    assert extraction_cache.get(key) == {"invoice_number": "42"}
+    assert extraction_cache.get(extraction_cache.make_key(CONTENT_SHA256, {"fields": []})) is None
+
+
+def test_key_depends_on_every_part(monkeypatch):
+    """Changing the content, schema, model or prompt version changes the key"""
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+
+    assert extraction_cache.make_key(CONTENT_SHA256, SCHEMA) == key
+    assert extraction_cache.make_key(hashlib.sha256(b"other").hexdigest(), SCHEMA) != key
+    assert extraction_cache.make_key(CONTENT_SHA256, None) != key
+
+    monkeypatch.setattr(extraction_cache, "PROMPT_VERSION", extraction_cache.PROMPT_VERSION + "1")
+    assert extraction_cache.make_key(CONTENT_SHA256, SCHEMA) != key
+
+
+def test_key_parts_are_length_prefixed(monkeypatch):
+    """Parts whose concatenation is the same still give different keys"""
+    monkeypatch.setattr(extraction_cache, "CACHE_MODEL", "model-1")
+    monkeypatch.setattr(extraction_cache, "PROMPT_VERSION", "2")
+    first = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+
+    monkeypatch.setattr(extraction_cache, "CACHE_MODEL", "model-")
+    monkeypatch.setattr(extraction_cache, "PROMPT_VERSION", "12")
+    second = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+
+    assert first != second
+
+
+def test_put_writes_atomically(cache_dir, monkeypatch):
+    """A failed write leaves neither a partial entry nor a temporary file behind"""
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+    extraction_cache.put(key, {"invoice_number": "42"})
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(extraction_cache.os, "replace", failing_replace)
+    extraction_cache.put(key, {"invoice_number": "43"})
+
+    # The previous entry is still served intact
+    assert extraction_cache.get(key) == {"invoice_number": "42"}
+    entry_dir = os.path.dirname(extraction_cache._path(key))
+    assert os.listdir(entry_dir) == [f"{key}.json"]
+
+
+def test_put_ignores_unserialisable_data(cache_dir):
+    """Data json cannot encode is not cached, raised or left as a temporary file"""
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+    extraction_cache.put(key, {"invoice_number": object()})
+
+    assert extraction_cache.get(key) is None
+    entry_dir = os.path.dirname(extraction_cache._path(key))
+    assert os.listdir(entry_dir) == []
+
+
+def test_unreadable_entry_is_a_miss(cache_dir):
+    """A corrupt entry is ignored rather than raised"""
+    key = extraction_cache.make_key(CONTENT_SHA256, SCHEMA)
+    path = extraction_cache._path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("{not json")
+
+    assert extraction_cache.get(key) is None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,137 @@
+"""
+Test FAISS indexing and index loading in the FastAPI app
+
+The embeddings model is replaced by a deterministic fake, and document state
+and indexes are kept in a temporary directory, so no API key or server is
+needed.
+"""
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import fastapi_app
+from utils.state_store import StateStore
+
+
+@pytest.fixture
+def app_state(tmp_path, monkeypatch):
+    """Isolate the app's state and indexes, and stub the model clients"""
+    embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(fastapi_app, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(fastapi_app, "get_llm", lambda: None)
+    fastapi_app.get_embedding_dimensions.cache_clear()
+    monkeypatch.setattr(fastapi_app, "document_store", StateStore("documents", db_path=str(tmp_path / "state.db")))
+    monkeypatch.setattr(fastapi_app, "VECTOR_DB_DIR", tmp_path / "vector_db")
+    monkeypatch.setattr(fastapi_app, "_vector_stores", fastapi_app.OrderedDict())
+    monkeypatch.setattr(fastapi_app, "_retrieval_cache", fastapi_app.OrderedDict())
+    # Parse in threads, so the stubbed loader below applies
+    monkeypatch.setattr(fastapi_app, "get_process_pool", lambda: ThreadPoolExecutor(max_workers=2))
+    yield embeddings
+    fastapi_app.get_embedding_dimensions.cache_clear()
+
+
+def _index_document(document_id, texts, embeddings):
+    """Register a document and build its index the way process_documents does"""
+    fastapi_app.document_store[document_id] = {
+        "id": document_id,
+        "filename": f"{document_id}.txt",
+        "uploaded_at": time.time(),
+        "status": "pending",
+        "file_path": f"/nonexistent/{document_id}.txt"
+    }
+    chunks = [Document(page_content=text, metadata={"source": document_id}) for text in texts]
+    fastapi_app._save_index(document_id, chunks, embeddings.embed_documents(texts), embeddings)
+
+
+def test_startup_preloads_indexed_documents(app_state):
+    """The lifespan loads the FAISS index of every recently indexed document"""
+    _index_document("doc-a", ["alpha"], app_state)
+    _index_document("doc-b", ["beta", "gamma"], app_state)
+
+    # Simulate a fresh worker that has not loaded anything yet
+    fastapi_app._vector_stores.clear()
+
+    with TestClient(fastapi_app.app):
+        assert set(fastapi_app._vector_stores) == {"doc_doc-a", "doc_doc-b"}
+
+
+def test_preload_skips_indexes_of_another_size(app_state, monkeypatch):
+    """Indexes built with a different embedding size are not loaded"""
+    _index_document("doc-a", ["alpha"], app_state)
+    fastapi_app._vector_stores.clear()
+
+    monkeypatch.setattr(fastapi_app, "get_embeddings", lambda: DeterministicFakeEmbedding(size=4))
+    fastapi_app.get_embedding_dimensions.cache_clear()
+    fastapi_app.preload_vector_stores()
+
+    assert "doc_doc-a" not in fastapi_app._vector_stores
+
+
+def test_reindex_by_another_worker_reloads_index(app_state):
+    """A loaded index is replaced when the shared indexed_at changes"""
+    _index_document("doc-a", ["alpha"], app_state)
+    first = fastapi_app.document_store["doc-a"]["indexed_at"]
+    stale = fastapi_app.get_vector_store("doc_doc-a", first)
+
+    # Another worker rebuilds the index and records a new indexed_at
+    _index_document("doc-a", ["alpha", "beta"], app_state)
+    fastapi_app._vector_stores["doc_doc-a"] = (first, stale)
+    second = fastapi_app.document_store["doc-a"]["indexed_at"]
+
+    reloaded = fastapi_app.get_vector_store("doc_doc-a", second)
+    assert reloaded is not stale
+    assert reloaded.index.ntotal == 2
+
+
+def _stored_vectors(vector_store):
+    """Map each chunk text of a FAISS store to its stored vector"""
+    return {
+        vector_store.docstore.search(docstore_id).page_content: vector_store.index.reconstruct(i).tolist()
+        for i, docstore_id in vector_store.index_to_docstore_id.items()
+    }
+
+
+def _load_whole_file(file_path):
+    """Stand-in for _load_and_split keeping each file as one chunk"""
+    with open(file_path) as f:
+        return 1, [Document(page_content=f.read(), metadata={"source": file_path})]
+
+
+def test_batch_indexing_splits_vectors_per_document(app_state, tmp_path, monkeypatch):
+    """Documents embedded together each get an index of only their own chunks"""
+    # Splitting is not under test here, and the real splitter loads a tokenizer
+    monkeypatch.setattr(fastapi_app, "_load_and_split", _load_whole_file)
+    documents = []
+    for document_id, text in (("doc-a", "first document text"), ("doc-b", "second document, other words")):
+        file_path = tmp_path / f"{document_id}.txt"
+        file_path.write_text(text)
+        fastapi_app.document_store[document_id] = {
+            "id": document_id,
+            "filename": file_path.name,
+            "uploaded_at": time.time(),
+            "status": "pending",
+            "file_path": str(file_path)
+        }
+        documents.append((document_id, str(file_path)))
+
+    asyncio.run(fastapi_app.process_documents(documents))
+
+    for document_id, file_path in documents:
+        document = fastapi_app.document_store[document_id]
+        assert document["status"] == "indexed"
+        vector_store = fastapi_app.get_vector_store(f"doc_{document_id}", document["indexed_at"])
+        stored = _stored_vectors(vector_store)
+        with open(file_path) as f:
+            assert list(stored) == [f.read()]
+        for text, vector in stored.items():
+            assert vector == pytest.approx(app_state.embed_query(text))
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,134 @@
+"""
+Test the in-memory flat index and search cache of the vector service
+
+Indexes and document state are kept in a temporary directory, and query
+embeddings come from a fixed table, so no API key or Chroma server is needed.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from api import vector_service
+from api.models import DocumentStatus
+from utils.state_store import StateStore
+
+# Chunk texts with their embeddings, and the embeddings of the search queries
+CHUNKS = {
+    "invoice number 42": [1.0, 0.0, 0.0],
+    "total amount 100": [0.0, 1.0, 0.0],
+    "due date friday": [0.0, 0.0, 1.0],
+}
+QUERIES = {
+    "invoice": [0.9, 0.1, 0.0],
+    "amount": [0.1, 0.9, 0.2],
+}
+
+
+@pytest.fixture
+def queries(tmp_path, monkeypatch):
+    """Isolate the service's indexes and state, and count query embeddings"""
+    db_path = str(tmp_path / "state.db")
+    monkeypatch.setattr(vector_service, "VECTOR_STORE_DIR", str(tmp_path / "vector_db"))
+    monkeypatch.setattr(vector_service, "document_metadata", StateStore("vector_documents", db_path=db_path))
+    monkeypatch.setattr(vector_service, "document_statuses", StateStore("vector_document_statuses", db_path=db_path))
+    monkeypatch.setattr(vector_service, "_flat_indexes", {})
+    monkeypatch.setattr(vector_service, "_search_cache", vector_service.OrderedDict())
+
+    embedded = []
+
+    async def embed_query(query):
+        embedded.append(query)
+        return tuple(QUERIES[query])
+
+    monkeypatch.setattr(vector_service, "embed_query", embed_query)
+    return embedded
+
+
+def _index(document_id, chunks, indexed_at=1.0):
+    """Record a document as indexed and save its flat index"""
+    vector_service.document_metadata[document_id] = {"indexed_at": indexed_at}
+    vector_service.document_statuses[document_id] = {"status": DocumentStatus.INDEXED}
+    # _add_chunks saves an empty (0, 0) matrix for a document without chunks
+    vectors = np.array(list(chunks.values()), dtype=np.float32) if chunks else np.empty((0, 0), dtype=np.float32)
+    metadatas = [{"chunk": i} for i in range(len(chunks))]
+    vector_service._save_flat_index(document_id, vectors, list(chunks), metadatas)
+
+
+def _search(document_id, query, k):
+    return [doc.page_content for doc in asyncio.run(vector_service.similarity_search(document_id, query, k))]
+
+
+def test_results_are_ranked_by_similarity(queries):
+    """The k most similar chunks come back, best first"""
+    _index("doc-1", CHUNKS)
+
+    assert _search("doc-1", "invoice", 2) == ["invoice number 42", "total amount 100"]
+    assert _search("doc-1", "amount", 1) == ["total amount 100"]
+
+
+def test_k_larger_than_chunk_count_returns_every_chunk(queries):
+    """Asking for more chunks than the document has returns all of them"""
+    _index("doc-1", CHUNKS)
+
+    assert _search("doc-1", "invoice", 10) == ["invoice number 42", "total amount 100", "due date friday"]
+
+
+def test_empty_index_returns_no_chunks(queries):
+    """A document with no chunks searches to an empty list without embedding the query"""
+    _index("doc-1", {})
+
+    assert _search("doc-1", "invoice", 3) == []
+    assert queries == []
+
+
+def test_index_is_loaded_from_disk(queries):
+    """A worker without the index in memory loads the saved vectors"""
+    _index("doc-1", CHUNKS)
+    vector_service._flat_indexes.clear()
+
+    assert _search("doc-1", "amount", 1) == ["total amount 100"]
+    assert "doc-1" in vector_service._flat_indexes
+
+
+def test_repeated_search_is_served_from_cache(queries):
+    """The same query and k reuse the cached result; another k does not"""
+    _index("doc-1", CHUNKS)
+
+    first = _search("doc-1", "invoice", 2)
+    assert _search("doc-1", "invoice", 2) == first
+    assert queries == ["invoice"]
+
+    _search("doc-1", "invoice", 1)
+    assert queries == ["invoice", "invoice"]
+
+
+def test_search_cache_evicts_least_recently_used(queries, monkeypatch):
+    """A full cache drops the entry used longest ago, keeping recently hit ones"""
+    monkeypatch.setattr(vector_service, "SEARCH_CACHE_SIZE", 2)
+    _index("doc-1", CHUNKS)
+
+    _search("doc-1", "invoice", 1)
+    _search("doc-1", "amount", 1)
+    _search("doc-1", "invoice", 1)  # hit, now most recently used
+    _search("doc-1", "invoice", 2)  # evicts ("amount", 1)
+
+    cached = {(key[2], key[3]) for key in vector_service._search_cache}
+    assert cached == {("invoice", 1), ("invoice", 2)}
+
+
+def test_reindex_misses_the_cache(queries):
+    """Results cached for an earlier indexed_at are not served after a re-index"""
+    _index("doc-1", CHUNKS, indexed_at=1.0)
+    assert _search("doc-1", "invoice", 1) == ["invoice number 42"]
+
+    # Another worker re-indexes the document with different chunks
+    _index("doc-1", {"late fee 5": [1.0, 0.0, 0.0]}, indexed_at=2.0)
+    vector_service._flat_indexes.clear()
+
+    assert _search("doc-1", "invoice", 1) == ["late fee 5"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
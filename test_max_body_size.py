@@ -0,0 +1,85 @@
+"""
+Test the request body size limit of the FastAPI app
+
+The middleware wraps a small app with a low limit, so the tests send a few
+bytes rather than MAX_UPLOAD_SIZE of them.
+"""
+
+import pytest
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from fastapi_app import MaxBodySizeMiddleware
+
+MAX_SIZE = 1024
+
+
+@pytest.fixture
+def client():
+    """A client for an app that echoes the size of what it received"""
+    app = FastAPI()
+    app.add_middleware(MaxBodySizeMiddleware, max_size=MAX_SIZE)
+
+    @app.post("/body")
+    async def body(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def _chunks(total, chunk_size=256):
+    """Yield total bytes in pieces, so the client sends no Content-Length"""
+    for start in range(0, total, chunk_size):
+        yield b"x" * min(chunk_size, total - start)
+
+
+def test_body_within_limit_is_passed_through(client):
+    """A body of exactly max_size bytes reaches the route"""
+    response = client.post("/body", content=b"x" * MAX_SIZE)
+    assert response.status_code == 200
+    assert response.json() == {"size": MAX_SIZE}
+
+    response = client.post("/body", content=_chunks(MAX_SIZE))
+    assert response.status_code == 200
+    assert response.json() == {"size": MAX_SIZE}
+
+
+def test_declared_length_over_limit_is_rejected(client):
+    """An oversized Content-Length is refused before the body is read"""
+    response = client.post("/body", content=b"x" * (MAX_SIZE + 1))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File too large"}
+
+
+def test_chunked_body_over_limit_is_rejected(client):
+    """A body without Content-Length is cut off once it passes the limit"""
+    response = client.post("/body", content=_chunks(MAX_SIZE * 4))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File too large"}
+
+
+def test_chunked_upload_over_limit_is_rejected(client):
+    """A streamed multipart upload over the limit is refused, not parsed"""
+    boundary = "test-boundary"
+
+    def multipart():
+        yield (f"--{boundary}\r\n"
+               'Content-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+               "Content-Type: application/pdf\r\n\r\n").encode()
+        yield from _chunks(MAX_SIZE * 4)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/upload",
+        content=multipart(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert response.status_code == 413
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,59 @@
+"""
+Test page extraction from PDF files
+
+Page-parallel extraction runs in the shared process pool and must return
+the same text, in the same order, as parsing every page in process.
+"""
+
+import fitz  # PyMuPDF
+import pytest
+
+from utils.pdf_extractor import (
+    PARALLEL_PAGE_THRESHOLD,
+    _extract_page_list,
+    extract_pages,
+    extract_pages_parallel,
+)
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """A PDF with enough pages to be parsed in parallel, each with distinct text"""
+    path = tmp_path / "pages.pdf"
+    doc = fitz.open()
+    for page_num in range(PARALLEL_PAGE_THRESHOLD * 2 + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {page_num} heading")
+        page.insert_text((72, 96), f"Amount due {page_num * 100}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_parallel_matches_serial(pdf_path):
+    """Pages parsed in the process pool match pages parsed in process"""
+    page_count = PARALLEL_PAGE_THRESHOLD * 2 + 1
+    serial = _extract_page_list(pdf_path, range(page_count))
+
+    assert extract_pages_parallel(pdf_path) == serial
+    assert "Page 3 heading" in serial[3]
+
+
+def test_selected_pages_keep_their_order(pdf_path):
+    """A large, unordered page selection comes back in the requested order"""
+    page_numbers = [12, 0, 5, 16, 1, 9, 3, 8, 2]
+    assert len(page_numbers) >= PARALLEL_PAGE_THRESHOLD
+
+    assert extract_pages(pdf_path, page_numbers) == _extract_page_list(pdf_path, page_numbers)
+
+
+def test_small_selection_reuses_reader(pdf_path):
+    """Below the threshold, pages are read from the caller's reader"""
+    import pypdf
+
+    reader = pypdf.PdfReader(pdf_path)
+    assert extract_pages(pdf_path, [2, 1], reader) == _extract_page_list(pdf_path, [2, 1])
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,140 @@
+"""
+Test the shared state store
+
+Each test uses its own database file, so nothing touches the state.db the
+servers use.
+"""
+
+import sqlite3
+import threading
+
+from utils.state_store import StateStore
+
+
+def test_fresh_database_is_empty(tmp_path):
+    """A new database file is created with an empty state table"""
+    db_path = str(tmp_path / "state.db")
+    store = StateStore("documents", db_path=db_path)
+
+    assert store.get("missing") is None
+    assert store.get("missing", {}) == {}
+    assert "missing" not in store
+    assert list(store.items()) == []
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_get_set_delete(tmp_path):
+    """Values round-trip through set and get, and delete removes them"""
+    store = StateStore("documents", db_path=str(tmp_path / "state.db"))
+
+    store["doc-1"] = {"status": "pending", "pages": 3}
+    assert store["doc-1"] == {"status": "pending", "pages": 3}
+    assert "doc-1" in store
+    assert dict(store.items()) == {"doc-1": {"status": "pending", "pages": 3}}
+
+    del store["doc-1"]
+    assert "doc-1" not in store
+    try:
+        store["doc-1"]
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("expected KeyError for a deleted key")
+
+
+def test_namespaces_are_separate(tmp_path):
+    """Stores with different namespaces share the file but not the keys"""
+    db_path = str(tmp_path / "state.db")
+    documents = StateStore("documents", db_path=db_path)
+    tasks = StateStore("tasks", db_path=db_path)
+
+    documents["id"] = {"kind": "document"}
+    assert "id" not in tasks
+    tasks["id"] = {"kind": "task"}
+    assert documents["id"] == {"kind": "document"}
+
+
+def test_update_merges_fields(tmp_path):
+    """update merges top-level fields, update_fields merges a nested dict"""
+    store = StateStore("tasks", db_path=str(tmp_path / "state.db"))
+
+    assert store.update("missing", status="done") is None
+    assert store.update_fields("missing", {"a": 1}) is None
+    assert "missing" not in store
+
+    store["task"] = {"status": "pending", "fields": {"a": "pending"}}
+    assert store.update("task", status="running") == {"status": "running", "fields": {"a": "pending"}}
+    store.update_fields("task", {"b": "done"})
+    assert store["task"] == {"status": "running", "fields": {"a": "pending", "b": "done"}}
+
+
+def test_delete_older_than(tmp_path):
+    """Values whose field is below the cutoff are removed, others are kept"""
+    db_path = str(tmp_path / "state.db")
+    cache = StateStore("cache", db_path=db_path)
+    other = StateStore("other", db_path=db_path)
+
+    cache["old"] = {"cached_at": 10.0}
+    cache["new"] = {"cached_at": 30.0}
+    cache["untimed"] = {"value": 1}
+    other["old"] = {"cached_at": 10.0}
+
+    assert cache.delete_older_than("cached_at", 20.0) == 1
+    assert dict(cache.items()) == {"new": {"cached_at": 30.0}, "untimed": {"value": 1}}
+    assert "old" in other
+
+
+def test_reads_return_copies(tmp_path):
+    """Mutating a value that was read does not change the stored value"""
+    store = StateStore("tasks", db_path=str(tmp_path / "state.db"))
+    store["task"] = {"fields": {}}
+
+    store["task"]["fields"]["a"] = "done"
+    assert store["task"] == {"fields": {}}
+
+
+def test_concurrent_field_updates_are_not_lost(tmp_path):
+    """Writers on separate connections updating the same key all keep their fields"""
+    db_path = str(tmp_path / "state.db")
+    store = StateStore("tasks", db_path=db_path)
+    store["task"] = {"fields": {}}
+
+    threads_count = 8
+    updates_per_thread = 25
+    start = threading.Barrier(threads_count)
+    errors = []
+
+    def writer(n):
+        # Each thread gets its own connection, so the writes contend on the
+        # database lock rather than on a Python lock
+        writer_store = StateStore("tasks", db_path=db_path)
+        start.wait()
+        try:
+            for i in range(updates_per_thread):
+                writer_store.update_fields("task", {f"{n}-{i}": i})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(store["task"]["fields"]) == threads_count * updates_per_thread
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for test in (test_fresh_database_is_empty, test_get_set_delete, test_namespaces_are_separate,
+                 test_update_merges_fields, test_delete_older_than, test_reads_return_copies,
+                 test_concurrent_field_updates_are_not_lost):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("State store tests passed")
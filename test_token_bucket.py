@@ -0,0 +1,100 @@
+"""
+Test the OpenAI rate limit budget of the vector service
+
+The bucket reads a fake clock, and waiting advances that clock instead of
+sleeping, so the tests run instantly and exactly.
+"""
+
+import asyncio
+
+import pytest
+
+from api import vector_service
+from api.vector_service import TokenBucket
+
+REQUESTS_PER_MIN = 60
+TOKENS_PER_MIN = 6000
+
+
+class FakeClock:
+    """Stand-in for the time module with a manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Drive TokenBucket from a fake clock"""
+    clock = FakeClock()
+    monkeypatch.setattr(vector_service, "time", clock)
+    monkeypatch.setattr(vector_service.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def test_idle_bucket_refills_to_capacity_only(clock):
+    """A long idle period refills the budget up to the per-minute limits, not past them"""
+    bucket = TokenBucket(REQUESTS_PER_MIN, TOKENS_PER_MIN)
+    bucket.available_requests = 0
+    bucket.available_tokens = 0
+
+    clock.now += 30
+    bucket._replenish()
+    assert bucket.available_requests == pytest.approx(REQUESTS_PER_MIN / 2)
+    assert bucket.available_tokens == pytest.approx(TOKENS_PER_MIN / 2)
+
+    clock.now += 3600
+    bucket._replenish()
+    assert bucket.available_requests == REQUESTS_PER_MIN
+    assert bucket.available_tokens == TOKENS_PER_MIN
+
+
+def test_acquire_within_budget_does_not_wait(clock):
+    """Requests within the budget are admitted at once and charged"""
+    bucket = TokenBucket(REQUESTS_PER_MIN, TOKENS_PER_MIN)
+
+    asyncio.run(bucket.acquire(1000))
+    asyncio.run(bucket.acquire(1000))
+
+    assert clock.sleeps == []
+    assert bucket.available_requests == REQUESTS_PER_MIN - 2
+    assert bucket.available_tokens == TOKENS_PER_MIN - 2000
+
+
+def test_acquire_waits_for_the_scarcer_budget(clock):
+    """An exhausted token budget delays the request until enough has refilled"""
+    bucket = TokenBucket(REQUESTS_PER_MIN, TOKENS_PER_MIN)
+    bucket.available_tokens = 0
+
+    asyncio.run(bucket.acquire(TOKENS_PER_MIN // 4))
+
+    # A quarter of the per-minute tokens takes 15 seconds to refill
+    assert sum(clock.sleeps) == pytest.approx(15)
+    assert bucket.available_tokens == pytest.approx(0)
+
+
+def test_acquire_over_capacity_is_capped(clock):
+    """A request larger than the whole budget waits for a full bucket, not forever"""
+    bucket = TokenBucket(REQUESTS_PER_MIN, TOKENS_PER_MIN)
+
+    # A full bucket admits it immediately and is left empty
+    asyncio.run(bucket.acquire(TOKENS_PER_MIN * 10))
+    assert clock.sleeps == []
+    assert bucket.available_tokens == 0
+
+    # An empty bucket admits it once completely refilled
+    asyncio.run(bucket.acquire(TOKENS_PER_MIN * 10))
+    assert sum(clock.sleeps) == pytest.approx(60)
+    assert bucket.available_tokens == pytest.approx(0)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+"""
+Test the legacy WSGI bridge to the FastAPI app
+
+adapters.wsgi_app is called the way a WSGI server would call it, with a
+minimal environ, so no server is needed.
+"""
+
+import io
+import threading
+
+import orjson
+
+import adapters
+
+
+def _environ(method, path, body=b""):
+    """Build a minimal WSGI environ for a request"""
+    return {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "REMOTE_ADDR": "127.0.0.1",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+    }
+
+
+def _call(method, path, body=b"", content_type=None):
+    """Call wsgi_app, returning (status, headers, body)"""
+    environ = _environ(method, path, body)
+    if content_type:
+        environ["CONTENT_TYPE"] = content_type
+    response = {}
+
+    def start_response(status, headers):
+        response["status"] = status
+        response["headers"] = dict(headers)
+
+    chunks = adapters.wsgi_app(environ, start_response)
+    return response["status"], response["headers"], b"".join(chunks)
+
+
+def test_wsgi_app_serves_the_fastapi_app():
+    """A GET through the bridge reaches the FastAPI health endpoint"""
+    status, headers, body = _call("GET", "/api/health")
+
+    assert status.startswith("200")
+    assert headers["content-type"] == "application/json"
+    assert orjson.loads(body)["status"] == "ok"
+
+
+def test_wsgi_app_passes_the_request_body():
+    """A POST body is streamed to the app, which validates it"""
+    status, _, body = _call("POST", "/api/extract", b'{"fields": []}', "application/json")
+
+    # document_id is missing, so FastAPI rejects the parsed body
+    assert status.startswith("422")
+    assert b"document_id" in body
+
+
+def test_wsgi_app_unknown_route():
+    """Unknown paths get the app's 404 rather than a bridge error"""
+    status, _, _ = _call("GET", "/no-such-route")
+    assert status.startswith("404")
+
+
+def test_closing_an_unread_response_disconnects_the_app():
+    """A server closing the response before iterating it stops the streaming app"""
+    disconnected = threading.Event()
+
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"first", "more_body": True})
+        # Consume the empty request body, then wait for the client to go away
+        await receive()
+        if (await receive())["type"] == "http.disconnect":
+            disconnected.set()
+
+    response = {}
+
+    def start_response(status, headers):
+        response["status"] = status
+        response["headers"] = headers
+
+    body = adapters.WSGItoASGIAdapter(streaming_app)(_environ("GET", "/stream"), start_response)
+    body.close()
+
+    assert response["status"].startswith("200")
+    assert response["headers"] == [("content-type", "text/plain")]
+    assert disconnected.wait(timeout=5)
+
+
+if __name__ == "__main__":
+    test_wsgi_app_serves_the_fastapi_app()
+    test_wsgi_app_passes_the_request_body()
+    test_wsgi_app_unknown_route()
+    test_closing_an_unread_response_disconnects_the_app()
+    print("WSGI bridge serves the FastAPI app")
@@ -7,6 +7,7 @@ via LangChain, with fallback from Azure to standard OpenAI if Azure configuratio
 
 import os
 import logging
+from functools import lru_cache
 from typing import Optional, Union
 
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
@@ -29,11 +30,15 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 # do not change this unless explicitly requested by the user
 OPENAI_MODEL = "gpt-4o"
 
+@lru_cache(maxsize=8)
 def get_chat_openai(temperature: float = 0.1, max_tokens: int = 300) -> BaseChatModel:
     """
     Creates an instance of a chat model client with the specified parameters.
     Prioritizing Azure OpenAI with fallback to standard OpenAI if Azure fails.
     
+    Clients are cached per (temperature, max_tokens), so the Azure connection
+    test and client setup run once rather than on every call.
+    
     Args:
         temperature: Controls randomness. Lower values like 0.1 make output more focused and deterministic.
         max_tokens: Maximum number of tokens to generate in the completion.
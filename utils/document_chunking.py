@@ -5,9 +5,13 @@ This module provides utilities for splitting large documents into manageable chu
 and merging extraction results from multiple chunks into a unified result.
 """
 
+import os
 import logging
 from typing import List, Dict, Any, Optional, Tuple
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.openai_service import OPENAI_WORKERS
 
 # Configure logging - use WARNING level to reduce overhead
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -18,6 +22,15 @@ DEFAULT_CHUNK_SIZE = 6000   # Even larger chunks to better capture complex finan
 DEFAULT_CHUNK_OVERLAP = 400  # Increased overlap to ensure complete financial tables between chunks
 MAX_CHUNKS_TO_PROCESS = 8   # Process more chunks for Morgan Stanley and other complex financial documents
 
+# Chunks extracted at once; each extraction is one blocking LLM call. Capped
+# at the OpenAI pool size, so chunk calls made through that pool never wait
+# in its queue for one another.
+CHUNK_CONCURRENCY = min(
+    int(os.environ.get("CHUNK_CONCURRENCY", str(MAX_CHUNKS_TO_PROCESS))),
+    OPENAI_WORKERS
+)
+_chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY, thread_name_prefix="chunk-extract")
+
 def split_text_into_chunks(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, 
                           chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
     """
@@ -235,14 +248,11 @@ def process_chunks_with_progress(chunks: List[str], extractor_func, schema: Opti
             }]
             return {}, progress_info
     
-    # Process multiple chunks with minimal logging
+    # Process multiple chunks concurrently with minimal logging
     total_chunks = len(chunks)
-    logger.info(f"Processing {total_chunks} chunks")
-    
-    # Track only essential metrics
-    successful_chunks = 0
+    logger.info(f"Processing {total_chunks} chunks with up to {CHUNK_CONCURRENCY} concurrent calls")
     
-    for i, chunk in enumerate(chunks):
+    def process_chunk(i: int, chunk: str):
         # Only log at start and end of each chunk
         logger.info(f"Processing chunk {i+1}/{total_chunks}")
         
@@ -252,38 +262,42 @@ def process_chunks_with_progress(chunks: List[str], extractor_func, schema: Opti
             
             # Calculate basic metrics
             field_count = len(chunk_result) if chunk_result else 0
-            field_names = list(chunk_result.keys())[:5] if chunk_result else []  # Only log first 5 fields
             
             # Only log success at warning level to reduce output
             if field_count > 0:
                 logger.info(f"Chunk {i+1}: extracted {field_count} fields")
-                successful_chunks += 1
             else:
                 logger.warning(f"Chunk {i+1}: no fields extracted")
             
-            # Store result directly in preallocated array
-            results[i] = chunk_result if chunk_result else {}
-            
             # Build progress info (minimal set of fields)
-            progress_info.append({
+            return chunk_result if chunk_result else {}, {
                 "chunk": i+1,
                 "total_chunks": total_chunks,
                 "percent_complete": (i+1) / total_chunks * 100,
                 "fields_extracted": field_count,
                 "status": "success"
-            })
+            }
             
         except Exception as e:
             logger.error(f"Error processing chunk {i+1}: {str(e)[:100]}")
             
             # Progress info with error (minimized)
-            progress_info.append({
+            return {}, {
                 "chunk": i+1,
                 "total_chunks": total_chunks,
                 "percent_complete": (i+1) / total_chunks * 100,
                 "status": "error",
                 "error": str(e)[:100]  # Truncate long error messages
-            })
+            }
+    
+    # The LLM calls are network-bound, so run them in threads and collect the
+    # results in chunk order
+    futures = [_chunk_executor.submit(process_chunk, i, chunk) for i, chunk in enumerate(chunks)]
+    for i, future in enumerate(futures):
+        results[i], progress = future.result()
+        progress_info.append(progress)
+    
+    successful_chunks = sum(1 for progress in progress_info if progress.get("fields_extracted"))
     
     # Efficiently merge results
     logger.info(f"Merging results from {successful_chunks} successful chunks")
@@ -0,0 +1,120 @@
+"""
+Extraction Result Cache
+
+This module provides a content-addressable cache of LLM extraction results.
+Results are keyed by the model, the prompt version, the document bytes and
+the extraction schema, so an identical upload with the same schema is served
+without re-parsing the document or calling the model.
+
+The cache is a directory of JSON files and is disabled unless the
+EXTRACTION_CACHE_DIR environment variable is set.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from utils.azure_openai_config import AZURE_OPENAI_DEPLOYMENT_NAME, OPENAI_MODEL
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Directory holding cached results; caching is off when unset
+EXTRACTION_CACHE_DIR = os.environ.get("EXTRACTION_CACHE_DIR")
+
+# Bump when the extraction prompts change, so stale results are not served
+PROMPT_VERSION = "1"
+
+# Model the cached results were produced with
+CACHE_MODEL = AZURE_OPENAI_DEPLOYMENT_NAME or OPENAI_MODEL
+
+def is_enabled() -> bool:
+    """Whether the extraction cache is configured"""
+    return bool(EXTRACTION_CACHE_DIR)
+
+
+def make_key(content_sha256: str, schema: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the cache key for a document and schema
+
+    Each part is length-prefixed, so different (document, schema) pairs can
+    never hash the same concatenated bytes.
+
+    Args:
+        content_sha256: SHA-256 hex digest of the document content
+        schema: Optional schema defining the fields to extract
+
+    Returns:
+        Hex digest identifying the extraction
+    """
+    schema_bytes = json.dumps(schema, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256()
+    for part in (CACHE_MODEL.encode('utf-8'), PROMPT_VERSION.encode('utf-8'),
+                 content_sha256.encode('ascii'), schema_bytes):
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(EXTRACTION_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the cached extraction data for key
+
+    Returns:
+        The cached data, or None on a miss or when caching is disabled
+    """
+    if not is_enabled():
+        return None
+    try:
+        with open(_path(key), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable extraction cache entry {key}: {str(e)}")
+        return None
+
+    data = entry.get("data")
+    return data if isinstance(data, dict) else None
+
+
+def put(key: str, data: Dict[str, Any]) -> None:
+    """
+    Store extraction data under key
+
+    The entry is written to a temporary file and renamed into place, so
+    concurrent readers never see a partial entry. Does nothing when caching
+    is disabled; write and serialisation errors are logged, not raised.
+    """
+    if not is_enabled():
+        return
+    entry = {
+        "data": data,
+        "model": CACHE_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    path = _path(key)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path),
+                                         suffix='.tmp', delete=False) as tmp:
+            tmp_path = tmp.name
+            json.dump(entry, tmp)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not write extraction cache entry {key}: {str(e)}")
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
@@ -7,6 +7,7 @@ OpenAI services, supporting both Azure OpenAI and standard OpenAI with automatic
 import os
 import json
 import logging
+import concurrent.futures
 from typing import Dict, Any, Optional, List
 
 from langchain_core.messages import SystemMessage, HumanMessage
@@ -20,6 +21,22 @@ from utils.azure_openai_config import get_chat_openai
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for an OpenAI response before giving up
+OPENAI_TIMEOUT = 25
+
+# Threads running OpenAI calls. The calls wait on the network rather than the
+# CPU, so the pool is sized for the requests in flight, not the CPU count: by
+# default one call for each of the up to 8 chunks of every one of the
+# EXTRACTION_WORKERS extraction jobs that can run at once.
+OPENAI_WORKERS = int(os.environ.get(
+    "OPENAI_WORKERS",
+    str(8 * int(os.environ.get("EXTRACTION_WORKERS", "4")))
+))
+
+# Shared pool running OpenAI calls, so each extraction does not start and
+# tear down its own thread
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=OPENAI_WORKERS, thread_name_prefix="openai")
+
 def extract_structured_data(text: str, schema: Optional[str] = None) -> Dict[str, Any]:
     """
     Extract structured data from text using OpenAI (Azure or standard) via LangChain.
@@ -83,21 +100,18 @@ Extract the following common fields (if present):
         
         # Make the API call to OpenAI via LangChain with timeout handling
         try:
-            # Set a timeout of 25 seconds to prevent UI freezing
-            import threading
-            import concurrent.futures
-            
-            def call_openai():
-                return client.invoke([system_message, human_message])
-                
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(call_openai)
-                try:
-                    response = future.result(timeout=25)  # Timeout after 25 seconds
-                    # Extract the response content
-                    response_content = response.content
-                except concurrent.futures.TimeoutError:
-                    raise Exception("OpenAI API request timed out after 25 seconds. Try with a smaller document.")
+            # Set a timeout to prevent UI freezing. The shared pool is not shut
+            # down here, so a timed-out call no longer blocks the caller.
+            future = EXECUTOR.submit(client.invoke, [system_message, human_message])
+            try:
+                response = future.result(timeout=OPENAI_TIMEOUT)
+                # Extract the response content
+                response_content = response.content
+            except concurrent.futures.TimeoutError:
+                # Drop the call if it is still queued, so it does not take a
+                # worker from later requests
+                future.cancel()
+                raise Exception(f"OpenAI API request timed out after {OPENAI_TIMEOUT} seconds. Try with a smaller document.")
         except Exception as invoke_error:
             logger.error(f"Error invoking OpenAI: {str(invoke_error)}")
             raise Exception(f"Failed to get response from OpenAI: {str(invoke_error)}")
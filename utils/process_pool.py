@@ -0,0 +1,50 @@
+"""
+Shared Process Pool
+
+This module provides the one process pool each server worker uses for
+CPU-bound document parsing, both page-parallel PDF extraction and the
+FastAPI app's load-and-split step.
+
+The pool is created on first use with the spawn start method. Pools are
+first used from request and background threads, and forking a process
+while other threads hold locks can deadlock the child. Spawned workers
+start a fresh interpreter instead.
+"""
+
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes per server worker. Gunicorn already runs 2N+1 server
+# workers, so each pool stays small.
+PROCESS_POOL_WORKERS = int(os.environ.get("PROCESS_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get this process's shared pool, starting it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=PROCESS_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the shared pool if it was started, cancelling queued work"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_process_pool)
@@ -0,0 +1,184 @@
+"""
+Shared State Store
+
+This module provides a small key/value store for document and task state,
+backed by SQLite in WAL mode. Unlike in-process dicts, the state is shared
+by every worker process of the server, so a document uploaded through one
+worker can be polled and extracted through another.
+
+Values are stored as JSON objects, grouped by namespace. They are encoded
+with orjson, since status polling decodes a value on every request.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import orjson
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Location of the state database, shared by all workers on this host
+STATE_DB_PATH = os.environ.get(
+    "STATE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'state.db')
+)
+
+# One connection per thread; sqlite3 connections must not be shared
+_local = threading.local()
+
+
+def _dumps(value: Any) -> str:
+    """Encode a value for the state table"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+
+def _get_connection(db_path: str) -> sqlite3.Connection:
+    """Get this thread's connection to the state database"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        connections[db_path] = conn
+    return conn
+
+
+class StateStore:
+    """
+    Dict-like view of one namespace of the state database.
+
+    Reads return copies, so nested values must be changed through
+    ``update`` or ``update_fields`` rather than mutated in place.
+    """
+
+    def __init__(self, namespace: str, db_path: str = STATE_DB_PATH):
+        self.namespace = namespace
+        self.db_path = db_path
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return _get_connection(self.db_path)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get the value stored under key, or default if there is none"""
+        row = self._conn.execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        return orjson.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store value under key, replacing any previous value"""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+            (self.namespace, key, _dumps(value))
+        )
+
+    def delete(self, key: str) -> None:
+        """Remove key if present"""
+        self._conn.execute(
+            "DELETE FROM state WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        )
+
+    def delete_older_than(self, field: str, cutoff: float) -> int:
+        """
+        Remove every value whose numeric top-level field is below cutoff.
+
+        Used to expire timestamped cache entries without reading them.
+
+        Returns:
+            The number of values removed
+        """
+        cursor = self._conn.execute(
+            "DELETE FROM state WHERE namespace = ? AND json_extract(value, ?) < ?",
+            (self.namespace, f"$.{field}", cutoff)
+        )
+        return cursor.rowcount
+
+    def update(self, key: str, **changes: Any) -> Optional[Dict[str, Any]]:
+        """
+        Merge top-level fields into the value stored under key.
+
+        Returns:
+            The updated value, or None if key does not exist
+        """
+        return self._modify(key, lambda value: value.update(changes))
+
+    def update_fields(self, key: str, values: Dict[str, Any], container: str = "fields") -> Optional[Dict[str, Any]]:
+        """
+        Merge entries into a nested dict of the value stored under key.
+
+        Used for per-field task status, so concurrent updates to different
+        fields of the same task do not overwrite each other.
+
+        Returns:
+            The updated value, or None if key does not exist
+        """
+        return self._modify(key, lambda value: value.setdefault(container, {}).update(values))
+
+    def _modify(self, key: str, change) -> Optional[Dict[str, Any]]:
+        """Apply change to the value under key in a single write transaction"""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+
+            value = orjson.loads(row[0])
+            change(value)
+            conn.execute(
+                "UPDATE state SET value = ? WHERE namespace = ? AND key = ?",
+                (_dumps(value), self.namespace, key)
+            )
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterate over (key, value) pairs in this namespace"""
+        rows = self._conn.execute(
+            "SELECT key, value FROM state WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchall()
+        for key, value in rows:
+            yield key, orjson.loads(value)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Dict[str, Any]) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.delete(key)
+
+    def __contains__(self, key: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM state WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        return row is not None
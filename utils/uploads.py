@@ -0,0 +1,54 @@
+"""
+Upload Helpers
+
+This module provides the shared helper both apps use to copy an uploaded
+file to disk. The content is hashed while it is copied, so it is read once.
+"""
+
+import hashlib
+import threading
+from typing import BinaryIO
+
+# Uploads are copied and hashed in chunks of this many bytes
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# One reusable chunk buffer per thread, so copying an upload does not
+# allocate a new bytes object for every chunk
+_buffers = threading.local()
+
+
+def _chunk_buffer() -> memoryview:
+    """Get this thread's reusable chunk buffer"""
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = memoryview(bytearray(STREAM_CHUNK_SIZE))
+    return buffer
+
+
+def save_stream(source: BinaryIO, file_path: str) -> str:
+    """
+    Copy a stream to a file, hashing it on the way
+
+    Streams supporting readinto are read into a per-thread buffer that is
+    reused for every chunk and every upload.
+
+    Args:
+        source: Readable binary stream, e.g. an upload
+        file_path: Destination path
+
+    Returns:
+        SHA-256 hex digest of the copied content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as out:
+        if hasattr(source, 'readinto'):
+            buffer = _chunk_buffer()
+            while n := source.readinto(buffer):
+                digest.update(buffer[:n])
+                out.write(buffer[:n])
+        else:
+            # SpooledTemporaryFile only gained readinto in Python 3.11
+            while chunk := source.read(STREAM_CHUNK_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+    return digest.hexdigest()
@@ -9,19 +9,28 @@ It includes rate limiting to prevent 429 errors from OpenAI API.
 import os
 import time
 import json
+import hashlib
 import logging
 import tempfile
+from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple, Union
 import uuid
 import threading
+from collections import OrderedDict
+from functools import lru_cache
 from time import sleep
 
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import AzureOpenAIEmbeddings
 from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+
+from utils.extraction_cache import PROMPT_VERSION
+from utils.pdf_extractor import extract_pages_parallel
+from utils.state_store import StateStore
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -40,13 +49,36 @@ if not OPENAI_API_KEY:
 CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 200
 
+# Leading bytes searched for the PDF signature
+PDF_HEADER_SIZE = 1024
+
+# Text budget of one extraction call (extract_structured_data truncates
+# longer text) and retries of a failed multi-field call
+MAX_EXTRACTION_CHARS = 14000
+MAX_EXTRACTION_RETRIES = 2
+
 # Rate limiting settings (requests per minute)
 RPM_LIMIT = 60  # Default 60 RPM for standard OpenAI API
 DELAY_BETWEEN_REQUESTS = 1.0  # Default delay of 1 second between requests
-BATCH_SIZE = 10  # Process 10 chunks at a time
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "10"))  # Process 10 chunks at a time
+DELAY_BETWEEN_FIELDS = float(os.environ.get("DELAY_BETWEEN_FIELDS", "0.5"))  # Delay between field LLM calls
+
+# Index metadata per document (index path, pages, chunks, added_at), shared
+# by all server workers so any of them can find and load a document's index
+document_metadata = StateStore("vector_document_metadata")
 
-# Document storage with metadata
-document_metadata = {}
+# Extracted field values, keyed by document, field and prompt version, so
+# re-running an extraction skips the LLM for fields already extracted
+FIELD_CACHE_TTL = int(os.environ.get("FIELD_CACHE_TTL", str(7 * 24 * 3600)))
+field_cache = StateStore("vector_field_cache")
+
+# Loaded FAISS stores by collection name, shared by request threads, in least
+# recently used order and capped at VECTOR_STORE_CACHE_SIZE. Each entry is
+# (version, store); the version is the document's added_at, so an index
+# rebuilt by another worker is reloaded from disk.
+VECTOR_STORE_CACHE_SIZE = int(os.environ.get("VECTOR_STORE_CACHE_SIZE", "32"))
+_vector_stores: "OrderedDict[str, Tuple[Optional[float], FAISS]]" = OrderedDict()
+_vector_stores_lock = threading.Lock()
 
 # Lock for thread-safe rate limiting
 rate_limit_lock = threading.Lock()
@@ -112,10 +144,14 @@ class RateLimitedEmbeddings(Embeddings):
         return self.wrapped_embeddings.embed_query(text)
 
 
+@lru_cache(maxsize=2)
 def get_embeddings(use_rate_limiting: bool = True):
     """
     Get OpenAI embeddings model with error handling and optional rate limiting
     
+    The model is created, and its connection tested, once per setting and
+    then shared, so all callers also share one rate limiter.
+    
     Args:
         use_rate_limiting: Whether to apply rate limiting to embeddings (default: True)
     
@@ -188,8 +224,30 @@ def get_embeddings(use_rate_limiting: bool = True):
     raise Exception("Failed to initialize Azure OpenAI or standard OpenAI embeddings. Check your API keys and configuration.")
 
 
-def get_vector_store(collection_name):
-    """Get vector store for the given collection name"""
+def _cache_vector_store(collection_name: str, version: Optional[float], vector_store) -> None:
+    """Keep a loaded store, evicting the least recently used beyond VECTOR_STORE_CACHE_SIZE"""
+    with _vector_stores_lock:
+        _vector_stores[collection_name] = (version, vector_store)
+        _vector_stores.move_to_end(collection_name)
+        while len(_vector_stores) > VECTOR_STORE_CACHE_SIZE:
+            _vector_stores.popitem(last=False)
+
+
+def get_vector_store(collection_name, version: Optional[float] = None):
+    """
+    Get vector store for the given collection name, loading it once per process
+    
+    Args:
+        collection_name: Name of the collection
+        version: Version of the index on disk (the document's added_at); a
+            cached store of another version is reloaded
+    """
+    with _vector_stores_lock:
+        cached = _vector_stores.get(collection_name)
+        if cached is not None and cached[0] == version:
+            _vector_stores.move_to_end(collection_name)
+            return cached[1]
+    
     try:
         embeddings = get_embeddings()
         
@@ -213,20 +271,42 @@ def get_vector_store(collection_name):
             # Save the empty index
             vector_store.save_local(index_path)
         
+        _cache_vector_store(collection_name, version, vector_store)
         return vector_store
     except Exception as e:
         logger.error(f"Error getting vector store: {str(e)}")
         raise
 
 
-def add_document_to_vector_store(document_id: str, file_content: bytes, file_name: Optional[str] = None) -> Dict[str, Any]:
+def is_pdf_document(header: bytes, file_name: Optional[str] = None) -> bool:
+    """
+    Whether a document is a PDF, judged by its leading bytes or its filename
+    
+    Args:
+        header: At least the first PDF_HEADER_SIZE bytes of the document
+        file_name: Original filename
+    """
+    if header.startswith(b'%PDF') or b'%PDF-' in header[:PDF_HEADER_SIZE]:
+        logger.info("Detected as PDF file based on content")
+        return True
+    if file_name and file_name.lower().endswith('.pdf'):
+        logger.info(f"Detected as PDF file based on filename: {file_name}")
+        return True
+    return False
+
+
+def add_document_to_vector_store(document_id: str, file_content: bytes, file_name: Optional[str] = None,
+                                 file_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Add a document to the vector store
     
     Args:
         document_id: Unique ID for the document
-        file_content: Binary content of the document
+        file_content: Binary content of the document. With file_path given,
+            the first PDF_HEADER_SIZE bytes are enough for a PDF.
         file_name: Original filename (used for file type detection)
+        file_path: Path of a saved copy of the content; PDFs are parsed from it
+            instead of being written to a temporary file first
         
     Returns:
         Dictionary with ingestion results
@@ -235,18 +315,8 @@ def add_document_to_vector_store(document_id: str, file_content: bytes, file_nam
     
     try:
         # Detect if this is a PDF file by checking the header or using filename
-        is_pdf = False
+        is_pdf = is_pdf_document(file_content, file_name)
         
-        # Check if it's a PDF by file header
-        if file_content.startswith(b'%PDF') or b'%PDF-' in file_content[:1024]:
-            is_pdf = True
-            logger.info("Detected as PDF file based on content")
-        
-        # Check if it's a PDF by filename
-        if file_name and file_name.lower().endswith('.pdf'):
-            is_pdf = True
-            logger.info(f"Detected as PDF file based on filename: {file_name}")
-            
         # Log file information for debugging
         logger.info(f"File type detection: is_pdf={is_pdf}, file_name={file_name}")
         if not is_pdf:
@@ -258,14 +328,19 @@ def add_document_to_vector_store(document_id: str, file_content: bytes, file_nam
         
         # Process document based on file type
         if is_pdf:
-            # Create a temporary file for the PDF
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                tmp.write(file_content)
-                tmp_path = tmp.name
+            pdf_path = file_path
+            if pdf_path is None:
+                # Create a temporary file for the PDF
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
+                    tmp.write(file_content)
+                    tmp_path = pdf_path = tmp.name
             
-            logger.info(f"Loading PDF file {tmp_path}")
-            loader = PyPDFLoader(tmp_path)
-            pages = loader.load()
+            logger.info(f"Loading PDF file {pdf_path}")
+            # Large PDFs are parsed page-parallel across processes
+            pages = [
+                Document(page_content=text, metadata={"source": pdf_path, "page": page_num})
+                for page_num, text in enumerate(extract_pages_parallel(pdf_path))
+            ]
             
         else:
             # Process as text content directly without using TextLoader
@@ -275,15 +350,14 @@ def add_document_to_vector_store(document_id: str, file_content: bytes, file_nam
                 logger.info(f"Processing text content of size {len(text_content)} characters")
                 
                 # Create a document with the text content
-                from langchain_core.documents import Document
                 pages = [Document(page_content=text_content, metadata={"source": f"text-{document_id}"})]
                 
             except Exception as text_error:
                 logger.error(f"Error processing text content: {str(text_error)}")
                 return {"success": False, "error": f"Error processing text content: {str(text_error)}", "document_id": document_id}
         
-        # Store metadata about the document
-        document_metadata[document_id] = {
+        # Metadata about the document, published once its index is saved
+        metadata = {
             "title": collection_name,
             "pages": len(pages),
             "added_at": time.time(),
@@ -301,23 +375,19 @@ def add_document_to_vector_store(document_id: str, file_content: bytes, file_nam
         chunks = text_splitter.split_documents(pages)
         
         # Update metadata
-        document_metadata[document_id]["chunks"] = len(chunks)
+        metadata["chunks"] = len(chunks)
         logger.info(f"Split document into {len(chunks)} chunks")
         
-        # Initialize vector store
-        vector_store = get_vector_store(collection_name)
-        
-        # Remove placeholder document if it exists (from empty index initialization)
-        # FAISS doesn't support delete by id, so we create a new one with the real content
+        # FAISS doesn't support delete by id, so we create a new store with the real content
         
         # Create path for this specific collection's FAISS index
         index_path = os.path.join(VECTOR_STORE_DIR, collection_name)
         
         # For FAISS, we need to create a new vector store from the chunks with rate limiting
-        embeddings = get_embeddings(use_rate_limiting=True)
+        embeddings = get_embeddings()
         
         # Process chunks in batches to avoid rate limits
-        batch_size = int(os.environ.get("BATCH_SIZE", str(BATCH_SIZE)))
+        batch_size = BATCH_SIZE
         total_chunks = len(chunks)
         
         logger.info(f"Processing {total_chunks} chunks in batches of {batch_size}")
@@ -347,8 +417,12 @@ def add_document_to_vector_store(document_id: str, file_content: bytes, file_nam
             vector_store = FAISS.from_texts(["placeholder"], embeddings, metadatas=[{"source": "placeholder"}])
             logger.warning("Document produced no chunks, created placeholder index")
             
-        # Save the completed index
+        # Save the completed index and serve searches from it, then let the
+        # other workers know where to load it from
         vector_store.save_local(index_path)
+        _cache_vector_store(collection_name, metadata["added_at"], vector_store)
+        metadata["index_path"] = index_path
+        document_metadata[document_id] = metadata
         logger.info(f"Added {total_chunks} chunks to FAISS vector store")
         
         processing_time = time.time() - start_time
@@ -369,13 +443,52 @@ def add_document_to_vector_store(document_id: str, file_content: bytes, file_nam
         
     finally:
         # Clean up the temporary file
-        if tmp_path and os.path.exists(tmp_path):
+        if tmp_path:
             try:
-                os.unlink(tmp_path)
+                Path(tmp_path).unlink(missing_ok=True)
             except Exception as cleanup_error:
                 logger.warning(f"Error cleaning up temporary file: {str(cleanup_error)}")
 
 
+def _field_cache_key(document_id: str, indexed_at: float, field: Dict[str, str]) -> str:
+    """
+    Build the cache key of a field of one indexed version of a document
+    
+    indexed_at is the added_at stored in the shared document metadata, so
+    every worker, and the same worker after a restart, builds the same key.
+    """
+    raw = f"{document_id}|{indexed_at}|{field['name']}|{field.get('description', '')}|{PROMPT_VERSION}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _get_cached_field(cache_key: str) -> Tuple[bool, Any]:
+    """Look up a cached field value, returning (hit, value); expired entries are deleted"""
+    entry = field_cache.get(cache_key)
+    if entry is None:
+        return False, None
+    if time.time() - entry["cached_at"] > FIELD_CACHE_TTL:
+        field_cache.delete(cache_key)
+        return False, None
+    return True, entry["value"]
+
+
+def _extract_fields_with_retries(text: str, fields: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Extract several fields in one LLM call, retrying failed or malformed responses"""
+    from document_extractor import extract_structured_data
+    
+    last_error = None
+    for attempt in range(MAX_EXTRACTION_RETRIES + 1):
+        try:
+            result = extract_structured_data(text, {"fields": fields})
+            if isinstance(result, dict):
+                return result
+            last_error = Exception(f"Expected a JSON object, got {type(result).__name__}")
+        except Exception as e:
+            last_error = e
+        logger.warning(f"Extraction attempt {attempt + 1} failed: {str(last_error)}")
+    raise last_error
+
+
 def extract_data_from_vector_store(document_id: str, fields: List[Dict[str, str]], 
                                   top_k_chunks: int = 3) -> Dict[str, Any]:
     """
@@ -390,70 +503,94 @@ def extract_data_from_vector_store(document_id: str, fields: List[Dict[str, str]
         Dictionary with extracted data
     """
     try:
-        if document_id not in document_metadata:
+        metadata = document_metadata.get(document_id)
+        if metadata is None:
             return {"success": False, "error": f"Document {document_id} not found in vector store"}
         
         collection_name = f"doc_{document_id}"
         # Use rate-limited embeddings for field extraction too
-        vector_store = get_vector_store(collection_name)
+        vector_store = get_vector_store(collection_name, version=metadata["added_at"])
         
         # Dictionary to store extraction results
         extracted_data = {}
         field_progress = {}
         
-        # Add delay between field processing
-        delay_between_fields = float(os.environ.get("DELAY_BETWEEN_FIELDS", "0.5"))
-        
-        # Process each field with its own query
+        # Serve fields extracted before from the cache
+        pending_fields = []
         for field in fields:
+            hit, value = _get_cached_field(_field_cache_key(document_id, metadata["added_at"], field))
+            if hit:
+                extracted_data[field["name"]] = value
+                field_progress[field["name"]] = "completed"
+            else:
+                pending_fields.append(field)
+        
+        if pending_fields:
+            logger.info(f"Field cache: {len(fields) - len(pending_fields)} hits, {len(pending_fields)} misses for document {document_id}")
+        
+        # Retrieve the chunks of each remaining field
+        retrieved = []
+        for field in pending_fields:
             field_name = field["name"]
-            field_description = field.get("description", "")
             
             # Update progress
             field_progress[field_name] = "processing"
             
             # Create a targeted query for this field
-            query = f"Extract information about {field_name}: {field_description}"
+            query = f"Extract information about {field_name}: {field.get('description', '')}"
             
             try:
-                # Retrieve relevant chunks from vector store for this field
                 relevant_chunks = vector_store.similarity_search(query, k=top_k_chunks)
-                
-                if not relevant_chunks:
-                    extracted_data[field_name] = None
-                    field_progress[field_name] = "completed"
-                    continue
-                
-                # Combine the text from all chunks
-                combined_text = "\n\n".join([chunk.page_content for chunk in relevant_chunks])
-                
-                # Use OpenAI to extract the specific field from the combined text
-                from document_extractor import extract_structured_data
-                
-                # Create a schema just for this field
-                field_schema = {
-                    "fields": [field]
-                }
-                
-                # Extract the field
-                extracted_field = extract_structured_data(combined_text, field_schema)
-                
-                # Store the extraction result
-                if field_name in extracted_field:
-                    extracted_data[field_name] = extracted_field[field_name]
-                else:
-                    extracted_data[field_name] = None
-                
-                # Update progress
-                field_progress[field_name] = "completed"
-                
-                # Add delay between field processing to avoid rate limits
-                time.sleep(delay_between_fields)
-                
             except Exception as e:
-                logger.error(f"Error extracting field {field_name}: {str(e)}")
+                logger.error(f"Error retrieving chunks for field {field_name}: {str(e)}")
                 extracted_data[field_name] = None
                 field_progress[field_name] = "failed"
+                continue
+            
+            if not relevant_chunks:
+                extracted_data[field_name] = None
+                field_progress[field_name] = "completed"
+                continue
+            
+            retrieved.append((field, relevant_chunks))
+        
+        # Extract as many fields per LLM call as their chunks fit the text budget
+        batch_size = max(1, MAX_EXTRACTION_CHARS // (top_k_chunks * CHUNK_SIZE))
+        for i in range(0, len(retrieved), batch_size):
+            # Add delay between LLM calls to avoid rate limits
+            if i:
+                time.sleep(DELAY_BETWEEN_FIELDS)
+            
+            batch = retrieved[i:i + batch_size]
+            batch_fields = [field for field, _ in batch]
+            
+            # Combine the chunks of all fields, without repeating shared chunks
+            combined_text = "\n\n".join(dict.fromkeys(
+                chunk.page_content for _, chunks in batch for chunk in chunks
+            ))
+            
+            try:
+                values = _extract_fields_with_retries(combined_text, batch_fields)
+            except Exception as e:
+                logger.error(f"Error extracting fields {', '.join(f['name'] for f in batch_fields)}: {str(e)}")
+                for field in batch_fields:
+                    extracted_data[field["name"]] = None
+                    field_progress[field["name"]] = "failed"
+                continue
+            
+            # Store the extraction results
+            for field in batch_fields:
+                extracted_data[field["name"]] = values.get(field["name"])
+                field_progress[field["name"]] = "completed"
+                field_cache[_field_cache_key(document_id, metadata["added_at"], field)] = {
+                    "value": extracted_data[field["name"]],
+                    "cached_at": time.time()
+                }
+        
+        # Expire entries that are never looked up again, such as those of
+        # replaced document versions, so the cache does not grow without bound
+        if retrieved:
+            field_cache.delete_older_than("cached_at", time.time() - FIELD_CACHE_TTL)
         
         return {
             "success": True,
@@ -477,13 +614,14 @@ def get_document_status(document_id: str) -> Dict[str, Any]:
     Returns:
         Dictionary with document status
     """
-    if document_id not in document_metadata:
+    metadata = document_metadata.get(document_id)
+    if metadata is None:
         return {"success": False, "error": f"Document {document_id} not found in vector store"}
     
     return {
         "success": True,
         "document_id": document_id,
-        "metadata": document_metadata[document_id]
+        "metadata": metadata
     }
 
 
@@ -513,6 +651,8 @@ def delete_document_from_vector_store(document_id: str) -> Dict[str, Any]:
         
         # Remove metadata
         del document_metadata[document_id]
+        with _vector_stores_lock:
+            _vector_stores.pop(collection_name, None)
         
         return {
             "success": True,
@@ -532,9 +672,10 @@ def list_documents_in_vector_store() -> Dict[str, Any]:
     Returns:
         Dictionary with list of documents
     """
+    metadata = dict(document_metadata.items())
     return {
         "success": True,
-        "documents": list(document_metadata.keys()),
-        "document_count": len(document_metadata),
-        "metadata": document_metadata
+        "documents": list(metadata.keys()),
+        "document_count": len(metadata),
+        "metadata": metadata
     }
\ No newline at end of file